@@ -1,6 +1,5 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
-from __future__ import print_function
 import sys
 import os
 import os.path
@@ -10,20 +9,42 @@ import re
 import shutil
 import argparse
 import filecmp
+import bisect
+import xml.etree.ElementTree as ET
+import threading
+import atexit
+import tempfile
+import json
+import hashlib
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+# End try
+from multiprocessing.pool import ThreadPool
+from operator import attrgetter
+from subprocess import DEVNULL
+from sys import intern
 
 ## Important paths
 thisFile = os.path.realpath(inspect.getfile(inspect.currentframe()))
 currDir = os.path.dirname(thisFile)
 
 ## Regular expression for source files
+## svn and git output is matched with ASCII-only classes (e.g., \d and \s)
+reFlags = re.ASCII
 cby_str="Committed by"
-reRevis = re.compile(r"^r(\d+)\s+\|\s+([^|]+)\|\s+([^|]+)\|\s+(\d+)\s+lines?$")
-reCommit = re.compile(r"^commit ([0-9a-f]+)$")
-reImport = re.compile(r"^\s*Imported from .*@([\d]+)$")
-reAuthor = re.compile(r"^\s*{} (.+)\s+at\s+([0-9][0-9\s:+-]+)$".format(cby_str))
-reLastChange = re.compile(r"^Last Changed Rev:\s+(\d+)$")
-reGitHash = re.compile("\A([a-fA-F0-9]+)\Z")
-reRemoteBranch = re.compile("\s*origin/(\S+)")
+reRevis = re.compile(r"^r(\d+)[ \t]+\|[ \t]+([^|\n]+)\|[ \t]+([^|\n]+)\|[ \t]+(\d+)[ \t]+lines?$",
+                     reFlags)
+reCommit = re.compile(r"^commit ([0-9a-f]+)$", reFlags)
+reImport = re.compile(r"^\s*Imported from .*@([\d]+)$", reFlags)
+reAuthor = re.compile(r"^\s*{} (.+)\s+at\s+([0-9][0-9\s:+-]+)$".format(cby_str), reFlags)
+reLastChange = re.compile(r"^Last Changed Rev:\s+(\d+)$", reFlags)
+# A revision range, [start][:[end]], or one of the keywords, HEAD or BASE
+reRevRange = re.compile(r"^(?:(HEAD|BASE)|(\d*)(?::(\d*|HEAD))?)$", reFlags)
+reGitHash = re.compile(r"\A[a-fA-F0-9]+\Z", reFlags)
+reGitVersion = re.compile(r"^git version (\d+)\.(\d+)", reFlags)
 
 ##############################
 ###
@@ -42,99 +63,242 @@ def quitOnFail(retcode, caller, command=None):
     if retcode != 0:
         errmsg = "{} failed with return code {}".format(caller, retcode)
         if command is not None:
-            errmsg = errmsg + os.linesep + " ".join(command)
+            errmsg = errmsg + "\n" + " ".join(command)
         # End if
         perr(errmsg, retcode)
     # End if
 # End quitOnFail
 
-def checkOutput(commands, verbose=False):
-    "Try a command line and return the output on success (None on failure)"
+def runCommand(commands, capture=False, quiet=False, cwd=None, input=None):
+    """Run a command line (no shell) and return (retcode, output)
+    capture: If True, output is the command's stdout, otherwise None
+    quiet:   If True, discard stderr (and stdout unless captured)
+    cwd:     If not None, run the command in this directory
+    input:   If not None, this string is fed to the command's stdin
+    retcode is None if the command could not be executed
+    Text is encoded and decoded like file names (os.fsencode / os.fsdecode)
+    so any bytes (e.g., in svn log messages) pass through unchanged"""
+    if capture:
+        stdout = subprocess.PIPE
+    elif quiet:
+        stdout = DEVNULL
+    else:
+        stdout = None
+    # End if
+    if quiet:
+        stderr = DEVNULL
+    else:
+        stderr = None
+    # End if
+    if input is None:
+        stdin = None
+    else:
+        stdin = subprocess.PIPE
+        input = os.fsencode(input)
+    # End if
     try:
-        outstr = subprocess.check_output(commands, stderr=open("/dev/null", mode='w'))
-    except OSError as e:
-        print("Execution of '{}' failed:".format(' '.join(commands)),
-              file=sys.stderr)
-        print("{}".format(e), file=sys.stderr)
+        # We never pass open files to children so skip the close-fds pass
+        proc = subprocess.Popen(commands, stdin=stdin, stdout=stdout,
+                                stderr=stderr, cwd=cwd, close_fds=False)
+        output = proc.communicate(input)[0]
+    except (OSError, ValueError) as e:
+        execError(commands, e)
+        return (None, None)
+    # End of try
+    if output is not None:
+        output = os.fsdecode(output)
+    # End if
+    return (proc.returncode, output)
+# End of runCommand
+
+def execError(commands, err):
+    "Report that a command line could not be executed"
+    print("Execution of '{}' failed:".format(' '.join(commands)),
+          file=sys.stderr)
+    print("{}".format(err), file=sys.stderr)
+# End of execError
+
+def pipeCommand(commands, cwd=None):
+    """Start a command line (no shell) and return its Popen object.
+    The command's stdout is a pipe to read from as output is produced,
+    stderr is discarded. Exits if the command could not be executed"""
+    try:
+        proc = subprocess.Popen(commands, stdout=subprocess.PIPE,
+                                stderr=DEVNULL, cwd=cwd, close_fds=False)
+    except (OSError, ValueError) as e:
+        execError(commands, e)
         exit(1)
-    except ValueError as e:
-        if (verbose):
-            print("ValueError in '{}':".format(' '.join(commands)),
-              file=sys.stderr)
-            print("{}".format(e), file=sys.stderr)
+    # End of try
+    return proc
+# End of pipeCommand
+
+def threadMap(func, items, workers):
+    """Return [func(x) for x in items] using up to workers threads.
+    func is run concurrently so it should only block on commands or file I/O."""
+    items = list(items)
+    if (workers > 1) and (len(items) > 1):
+        pool = ThreadPool(min(workers, len(items)))
+        try:
+            results = pool.map(func, items)
+        finally:
+            pool.close()
+            pool.join()
+        # End try
+    else:
+        results = [ func(x) for x in items ]
+    # End if
+    return results
+# End of threadMap
+
+def splitLines(stream):
+    """Yield the lines read from (binary) stream, decoded like runCommand
+    output, without their LF line ending.
+    Like str.split, a final LF is followed by an empty line"""
+    line = "\n"
+    for rawline in stream:
+        line = os.fsdecode(rawline)
+        if line.endswith("\n"):
+            yield line[:-1]
+        else:
+            yield line
+        # End if
+    # End for
+    if line.endswith("\n"):
+        yield ""
+    # End if
+# End of splitLines
+
+def xmlEntries(commands, handler, cwd=None):
+    """Run a command line with XML output, passing each <entry> element
+    to handler as soon as it has been parsed.
+    Return True if the command succeeded and its output was well formed"""
+    proc = pipeCommand(commands, cwd=cwd)
+    wellFormed = True
+    try:
+        for (_, elem) in ET.iterparse(proc.stdout):
+            if (elem.tag == "entry"):
+                handler(elem)
+                elem.clear()
             # End if
-            outstr = None
-    except subprocess.CalledProcessError as e:
+        # End for
+    except ET.ParseError:
+        wellFormed = False
+    # End try
+    proc.stdout.close()
+    return (proc.wait() == 0) and wellFormed
+# End of xmlEntries
+
+def checkOutput(commands, verbose=False, cwd=None):
+    "Try a command line and return the output on success (None on failure)"
+    (retcode, outstr) = runCommand(commands, capture=True, quiet=True, cwd=cwd)
+    if retcode is None:
+        exit(1)
+    elif retcode != 0:
         if (verbose):
-            print("CalledProcessError in '{}':".format(' '.join(commands)),
-              file=sys.stderr)
-            print("{}".format(e), file=sys.stderr)
+            print("'{}' failed with return code {}".format(' '.join(commands),
+                                                           retcode),
+                  file=sys.stderr)
         # End if
         outstr = None
-    # End of try
+    # End if
     return outstr
 # End of checkOutput
 
-def scall(commands):
+def scall(commands, cwd=None):
     "Try a command line and return the return value (-1 on failure)"
-    try:
-        retcode = subprocess.check_call(commands)
-    except OSError as e:
-        print("Execution of '{}' failed".format(' '.join(commands)),
-              file=sys.stderr)
-        print("{}".format(e), file=sys.stderr)
-        retcode = -1
-    except ValueError as e:
-        print("ValueError in '{}'".format(' '.join(commands)), file=sys.stderr)
-        print("{}".format(e), file=sys.stderr)
-        retcode = -1
-    except subprocess.CalledProcessError as e:
-        print("CalledProcessError in '{}'".format(' '.join(commands)),
+    (retcode, _) = runCommand(commands, cwd=cwd)
+    if (retcode is not None) and (retcode != 0):
+        print("'{}' failed with return code {}".format(' '.join(commands),
+                                                       retcode),
               file=sys.stderr)
-        print("{}".format(e), file=sys.stderr)
+    # End if
+    if retcode != 0:
         retcode = -1
-        # End of try
+    # End if
     return retcode
 # End of scall
 
-def retcall(commands):
+def retcall(commands, cwd=None):
     "Try a command line and return the return value. Suppress normal output"
-    FNULL = open(os.devnull, 'w')
-    try:
-        retcode = subprocess.call(commands, stdout=FNULL, stderr=subprocess.STDOUT)
-    except OSError as e:
-        print("Execution of '{}' failed".format(' '.join(commands)),
-              file=sys.stderr)
-        print("{}".format(e), file=sys.stderr)
-    except ValueError as e:
-        print("ValueError in '{}'".format(' '.join(commands)),
-              file=sys.stderr)
-        print("{}".format(e), file=sys.stderr)
-    except subprocess.CalledProcessError as e:
-        print("CalledProcessError in '{}'".format(' '.join(commands)),
-              file=sys.stderr)
-        print("{}".format(e), file=sys.stderr)
-    # End of try
+    (retcode, _) = runCommand(commands, quiet=True, cwd=cwd)
+    if retcode is None:
+        retcode = -1
+    # End if
     return retcode
 # End of retcall
 
+def checkCall(commands, cwd=None):
+    """Try a command line (suppressing normal output) and quit on failure.
+    The error message (naming the command) is only formatted on failure"""
+    retcode = retcall(commands, cwd=cwd)
+    if retcode != 0:
+        if cwd is None:
+            cwd = os.getcwd()
+        # End if
+        quitOnFail(retcode, "'{}' in {}".format(' '.join(commands), cwd))
+    # End if
+# End of checkCall
+
 def file_diff(file1, file2):
     """Return True if there is some difference between file1 and file2"""
-    diff = not os.path.exists(file2)
-    if not diff:
-        # Check for permission or file size changes
-        stat1 = os.stat(file1)
+    try:
         stat2 = os.stat(file2)
-        diff = stat1.st_mode != stat2.st_mode
-        diff = diff or (stat1.st_size != stat2.st_size)
-        diff = diff or (stat1.st_uid != stat2.st_uid)
-        diff = diff or (stat1.st_gid != stat2.st_gid)
-    # End if
-    # Make sure the file is really the same
-    diff = diff or (not filecmp.cmp(file1, file2, shallow=False))
-    return diff
+    except OSError:
+        return True
+    # End try
+    # Check for permission, ownership or file size changes
+    stat1 = os.stat(file1)
+    if ((stat1.st_mode, stat1.st_size, stat1.st_uid, stat1.st_gid) !=
+        (stat2.st_mode, stat2.st_size, stat2.st_uid, stat2.st_gid)):
+        return True
+    # End if
+    # Files copied by copySvn2Git keep their modification time so a
+    # matching time means the file is unchanged.
+    if (stat1.st_mtime == stat2.st_mtime):
+        return False
+    # End if
+    # Make sure the file is really the same by reading both.
+    return not filecmp.cmp(file1, file2, shallow=False)
 # End def file_diff
 
+## Linux ioctl which clones (reflinks) a whole file on btrfs, XFS, etc.
+if sys.platform.startswith("linux"):
+    FICLONE = 0x40049409
+else:
+    FICLONE = None
+# End if
+
+def copyFile(src, dst):
+    """Copy src to dst with its permission bits and times, like shutil.copy2.
+    The data is cloned or copied within the kernel when the filesystems
+    allow it, otherwise shutil.copyfile is used"""
+    copied = False
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if (fcntl is not None) and (FICLONE is not None):
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                copied = True
+            except OSError:
+                pass # Not supported here
+            # End try
+        # End if
+        if (not copied) and hasattr(os, "copy_file_range"):
+            try:
+                while (os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30) > 0):
+                    pass
+                # End while
+                copied = True
+            except OSError:
+                pass # Not supported here (e.g., across filesystems)
+            # End try
+        # End if
+    # End with
+    if (not copied):
+        shutil.copyfile(src, dst)
+    # End if
+    shutil.copystat(src, dst)
+# End def copyFile
+
 ##############################
 ###
 ### Classes
@@ -146,45 +310,40 @@ class SvnRevRange(object):
     Instance variables:
     start = -1 # -1 means BASE, 0 means absent
     end   = -1 # -1 means most recent (HEAD), 0 means absent
+    rangeStr = '' # svn -r argument for this range (computed once)
     """
     def __init__(self, revstr):
         self.start = -1
         self.end = -1
         if (revstr is not None):
-            revs = revstr.split(":")
-            if (len(revs) > 2):
-                quitOnFail(1, "Illegal revision string, '{}'".format(revstr))
-            elif (len(revs) == 2):
-                if (len(revs[0]) > 0):
-                    self.start = int(revs[0])
+            match = reRevRange.match(revstr)
+            if (match is None):
+                quitOnFail(1, "Badly formatted revision string, '{}'".format(revstr))
+            # End if
+            (keyword, start, end) = match.groups()
+            if (keyword == "HEAD"):
+                self.start = 0
+            elif (keyword == "BASE"):
+                self.end = 0
+            else:
+                if (len(start) > 0):
+                    self.start = int(start)
                 # No else, argument was left off, implied BASE
                 # End if
-                if (len(revs[1]) > 0):
-                    self.end = int(revs[1])
+                if (end is None):
+                    # A single revision (a blank string keeps BASE)
+                    self.end = 0
+                elif (len(end) > 0) and (end != "HEAD"):
+                    self.end = int(end)
                 # No else, argument was left off, implied HEAD
                 # End if
-            elif (revstr == "HEAD"):
-                self.start = 0
-                self.end = -1
-            elif (revstr == "BASE"):
-                self.start = -1
-                self.end = 0
-            elif (len(revs) == 1):
-                if (len(revs[0]) > 0):
-                    if (not isinstance(revs[0], int)):
-                        self.start = int(revs[0])
-                    else:
-                        self.start = revs[0]
-                    # end if
-                self.end = 0
-            else:
-                quitOnFail(1, "Badly formatted revision string, {}".format(revstr))
             # End if
-        # no else, blank string uses defaults
+        # no else, None uses defaults
         # End if
+        self.rangeStr = self.formatRevString()
     # end def  __init__
 
-    def revString(self):
+    def formatRevString(self):
         if (self.start < 0):
             sstr = "1" # svn log doesn't allow BASE
         elif (self.start == 0):
@@ -205,6 +364,10 @@ class SvnRevRange(object):
             revstr = sstr+estr
         # End if
         return revstr
+    # end def formatRevString
+
+    def revString(self):
+        return self.rangeStr
     # end def revString
 
     def revStart(self):
@@ -214,29 +377,82 @@ class SvnRevRange(object):
     def revEnd(self):
         return self.end
     # end def revEnd
+
+    def revBounds(self):
+        """Return the (lowest, highest) revision numbers of this range
+        (highest is sys.maxsize for HEAD) or None if the range is just HEAD"""
+        if (self.start == 0):
+            return None
+        # End if
+        start = max(self.start, 1) # svn log doesn't allow BASE
+        if (self.end < 0):
+            end = sys.maxsize
+        elif (self.end == 0):
+            end = start
+        else:
+            end = self.end
+        # End if
+        return (min(start, end), max(start, end))
+    # end def revBounds
 # End class SvnRevRange
 
+def parseRevList(revarg):
+    "Return the list of SvnRevRange objects for a comma-separated --rev argument"
+    return [ SvnRevRange(rev) for rev in revarg.split(",") ]
+# End def parseRevList
+
+def mergeRevRanges(revlist):
+    """Return the sorted svn -r arguments covering all the ranges in revlist
+    which have revBounds, with overlapping or adjacent ranges merged"""
+    merged = []
+    for (start, end) in sorted([ x.revBounds() for x in revlist if x.revBounds() ]):
+        if merged and (start <= merged[-1][1] + 1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+        # End if
+    # End for
+    revstrs = []
+    for (start, end) in merged:
+        if (end == sys.maxsize):
+            revstrs.append("{}:HEAD".format(start))
+        elif (start == end):
+            revstrs.append(str(start))
+        else:
+            revstrs.append("{}:{}".format(start, end))
+        # End if
+    # End for
+    return revstrs
+# End def mergeRevRanges
+
 class LogEntry(object):
     """A class to hold a single svn log entry
     Instance variables
-    revstr = 0       # Revision number (as string)
+    revnum = 0       # Revision number (as an integer)
     committer = ''   # Who made the commit
     commitDate = ''  # Date and time of commit
     URL = ''         # URL of the repo (including any subdirectory) for revision
+    NB: committer and URL are interned as they repeat across many entries
     """
+    __slots__ = ('revnum', 'committer', 'commit_date', 'URL')
+
     def __init__(self, rev, who, when, url):
-        self.revstr = rev
-        self.committer = who
+        self.revnum = int(rev)
+        if (who is None):
+            self.committer = None
+        else:
+            self.committer = intern(who)
+        # End if
         self.commit_date = when
-        self.URL = url
+        self.URL = intern(url)
     # End def __init__
 
     def revision(self):
-        return str(self.revstr)
+        return str(self.revnum)
     # End def revision
 
     def revNum(self):
-        return int(self.revstr)
+        return self.revnum
     # End def revNum
 
     def who(self):
@@ -259,6 +475,8 @@ class SvnLogEntry(LogEntry):
     message = None   # Commit message
     revTag = None    # Optional tag string if this entry is from a tag
     """
+    __slots__ = ('message', 'revTag')
+
     def __init__(self, rev, who, when, url, lines, tag=None):
         super(self.__class__, self).__init__(rev, who, when, url)
         self.message = list(lines)
@@ -268,21 +486,18 @@ class SvnLogEntry(LogEntry):
     def formatLogMessage(self):
         # First, create a short first line
         if (len(self.message[0]) > 72):
-            logm = self.message[0][0:68] + ' ...'
+            first = self.message[0][0:68] + ' ...'
         else:
-            logm = self.message[0]
+            first = self.message[0]
         # End if
-        logm = logm + os.linesep + os.linesep
-        # Include some import information
-        logm = logm + 'Imported from ' + self.url() + "@{}".format(self.revNum())
-        logm = logm + os.linesep + cby_str + ' ' + str(self.committer)
-        logm = logm + ' at ' + str(self.commit_date) + os.linesep
-        logm = logm + 'Original svn commit message:' + os.linesep
+        parts = [first, '',
+                 # Include some import information
+                 'Imported from {}@{}'.format(self.url(), self.revNum()),
+                 '{} {} at {}'.format(cby_str, self.committer, self.commit_date),
+                 'Original svn commit message:', '']
         # Now, include full original log message
-        for line in self.message:
-            logm = logm + os.linesep + line
-        # End for
-        return logm
+        parts.extend(self.message)
+        return "\n".join(parts)
     # End def formatLogMessage
 
     def tag(self):
@@ -302,6 +517,8 @@ class Git2svnLogEntry(LogEntry):
     NB: The super class holds the original SVN information, not git info
       This allows sorting by SVN revision number
     """
+    __slots__ = ('gitCommit',)
+
     def __init__(self, gcommit, svnRev, svnWho, svnWhen, svnURL):
         super(self.__class__, self).__init__(svnRev, svnWho, svnWhen, svnURL)
         self.gitCommit = gcommit
@@ -328,32 +545,244 @@ class gitRef(object):
 ###
 ##############################
 
+## Background removals of replaced export trees
+cleanupThreads = []
+
+def joinCleanupThreads():
+    "Wait for any background tree removals to finish"
+    for thread in cleanupThreads:
+        thread.join()
+    # End for
+    del cleanupThreads[:]
+# End def joinCleanupThreads
+
+atexit.register(joinCleanupThreads)
+
+## Exported files get their last commit time, so a file unchanged between
+## revisions keeps its modification time and file_diff need not read it
+svnExportOptions = ["--ignore-externals",
+                    "--config-option", "config:miscellany:use-commit-times=yes"]
+
+def svnExportCall(newDir, repoURL, revstr=None):
+    "Export repoURL (at revstr if not None) into newDir, return the return code"
+    if (os.path.exists(newDir)):
+        # Leftover from a failed export
+        shutil.rmtree(newDir)
+    # End if
+    if (revstr is None):
+        retcode = scall(["svn", "export"] + svnExportOptions + [repoURL, newDir])
+    else:
+        retcode = retcall(["svn", "export"] + svnExportOptions + ["-r{}".format(revstr), repoURL, newDir])
+    # End if
+    return retcode
+# End def svnExportCall
+
+def svnExportThread(result, newDir, repoURL, revstr):
+    "Thread target for svnPrefetch, the return code is appended to result"
+    result.append(svnExportCall(newDir, repoURL, revstr))
+# End def svnExportThread
+
+## Background exports, (exportDir, repoURL, revstr) --> (thread, result, newDir)
+svnPrefetches = {}
+
+def svnPrefetchWait():
+    "Wait for and discard any unused background exports"
+    for (thread, result, newDir) in svnPrefetches.values():
+        thread.join()
+        if (os.path.exists(newDir)):
+            shutil.rmtree(newDir)
+        # End if
+    # End for
+    svnPrefetches.clear()
+# End def svnPrefetchWait
+
+atexit.register(svnPrefetchWait)
+
+def svnPrefetch(exportDir, repoURL, revstr):
+    """Start exporting a subversion commit in the background so a later
+    svnExport call with the same arguments can use it without waiting
+    for the svn server. Each export is staged in its own directory."""
+    key = (exportDir, repoURL, str(revstr))
+    if (key not in svnPrefetches):
+        result = []
+        newDir = "{}.r{}".format(exportDir, revstr)
+        thread = threading.Thread(target=svnExportThread,
+                                  args=(result, newDir, repoURL, revstr))
+        thread.start()
+        svnPrefetches[key] = (thread, result, newDir)
+    # End if
+# End def svnPrefetch
+
 def svnExport(exportDir, repoURL, revstr=None):
     """Export a subversion commit, with optional revision
-    NB: If the destination directory, exportDir, exists it is first removed
+    NB: The export is staged in a new directory which then replaces
+    exportDir. Any previous exportDir tree is removed in the background.
+    A matching export started by svnPrefetch is used if there is one.
     """
+    oldDir = exportDir + ".old"
+    prefetched = svnPrefetches.pop((exportDir, repoURL, str(revstr)), None)
+    if (prefetched is not None):
+        (thread, result, newDir) = prefetched
+        thread.join()
+        retcode = result[0] if result else -1
+    else:
+        newDir = exportDir + ".new"
+        retcode = svnExportCall(newDir, repoURL, revstr)
+    # End if
+    if (retcode != 0):
+        if (revstr is None):
+            caller = "svnExport {} {}".format(exportDir, repoURL)
+        else:
+            caller = "svnExport -r{} {} {}".format(revstr, repoURL, exportDir)
+        # End if
+        quitOnFail(retcode, caller)
+    # End if
+    # The previous removal (if any) must be done before oldDir is reused
+    joinCleanupThreads()
+    if (os.path.exists(oldDir)):
+        shutil.rmtree(oldDir)
+    # End if
     if (os.path.exists(exportDir)):
-        shutil.rmtree(exportDir)
+        os.rename(exportDir, oldDir)
+        thread = threading.Thread(target=shutil.rmtree, args=(oldDir,))
+        thread.start()
+        cleanupThreads.append(thread)
     # End if
-    if (revstr is None):
-        caller = "svnExport {} {}".format(exportDir, repoURL)
-        retcode = scall(["svn", "export", "--ignore-externals", repoURL, exportDir])
+    os.rename(newDir, exportDir)
+# End def svnExport
+
+## Working copies made current with their URL by svnUpdate, (wcDir, repoURL)
+svnWorkingCopies = set()
+
+def svnUpdate(wcDir, repoURL, revstr):
+    """Bring wcDir, a working copy of repoURL, to revision revstr.
+    The first call for wcDir switches it to repoURL (or checks it out
+    again if that fails), later calls only fetch the changes since the
+    last revision. The working copy gets the same options as svnExport."""
+    revarg = "-r{}".format(revstr)
+    if ((wcDir, repoURL) in svnWorkingCopies):
+        retcode = retcall(["svn", "update"] + svnExportOptions + [revarg, wcDir])
     else:
-        caller = "svnExport -r{} {} {}".format(revstr, repoURL, exportDir)
-        retcode = retcall(["svn", "export", "--ignore-externals", "-r{}".format(revstr), repoURL, exportDir])
+        retcode = -1
+        if (os.path.isdir(os.path.join(wcDir, ".svn"))):
+            retcode = retcall(["svn", "switch"] + svnExportOptions + [revarg, repoURL, wcDir])
+        # End if
+        if (retcode != 0):
+            # Not a working copy (e.g., an earlier export) or not usable
+            if (os.path.exists(wcDir)):
+                shutil.rmtree(wcDir)
+            # End if
+            retcode = retcall(["svn", "checkout"] + svnExportOptions + [revarg, repoURL, wcDir])
+        # End if
+        if (retcode == 0):
+            svnWorkingCopies.add((wcDir, repoURL))
+        # End if
     # End if
-    quitOnFail(retcode, caller)
-# End def svnExport
+    if (retcode != 0):
+        quitOnFail(retcode, "svnUpdate -r{} {} {}".format(revstr, repoURL, wcDir))
+    # End if
+# End def svnUpdate
+
+## Text in svn diff output for changes which git apply would skip or reject
+svnDiffUnapplied = ("\nProperty changes on: ", "\nCannot display: ")
+
+def svnApplyDiff(gitDir, repoURL, prevRev, revstr):
+    """Apply the changes to repoURL from prevRev to revstr to the working
+    tree and index of gitDir. Return True if they were all applied.
+    Nothing is applied if the diff is empty or has changes git apply
+    cannot make (e.g., to properties or binary files)."""
+    diff = checkOutput(["svn", "diff", "--git", "-r{}:{}".format(prevRev, revstr), repoURL])
+    if (not diff) or any([ x in diff for x in svnDiffUnapplied ]):
+        return False
+    # End if
+    # git apply checks the whole patch before changing anything
+    (retcode, output) = runCommand(["git", "apply", "--index", "--whitespace=nowarn"],
+                                   quiet=True, cwd=gitDir, input=diff)
+    gitRepoChanged(gitDir)
+    return (retcode == 0)
+# End def svnApplyDiff
+
+## gitDir --> (repoURL, revision) last brought into gitDir by processRevision
+svnLastApplied = {}
+
+## RAM disk (tmpfs) used by --tmpfs-export
+ramDiskDir = "/dev/shm"
+
+def ramExportDir(exportDir, gitDir, copies):
+    """Return a staging directory on the RAM disk to use in place of exportDir.
+    The size of one export is estimated from the larger of the gitDir
+    working tree and an existing exportDir tree. exportDir is returned if
+    copies of it might not fit, if there is no tree to measure (e.g., a
+    first migration) or if there is no RAM disk.
+    The RAM disk directory is removed at exit."""
+    if not (os.path.isdir(ramDiskDir) and os.access(ramDiskDir, os.W_OK)):
+        print("WARNING: No RAM disk at {}, exporting to {}".format(ramDiskDir, exportDir))
+        return exportDir
+    # End if
+    treeSize = 0
+    for tree in (gitDir, exportDir):
+        size = 0
+        if (os.path.isdir(tree)):
+            for fname in treeFiles(tree):
+                try:
+                    size = size + os.lstat(os.path.join(tree, fname)).st_size
+                except OSError:
+                    pass
+                # End try
+            # End for
+        # End if
+        treeSize = max(treeSize, size)
+    # End for
+    if (treeSize == 0):
+        print("WARNING: No existing tree to estimate the export size, exporting to {}".format(exportDir))
+        return exportDir
+    # End if
+    fsstat = os.statvfs(ramDiskDir)
+    if (treeSize * copies > fsstat.f_bavail * fsstat.f_frsize):
+        print("WARNING: Not enough space on {}, exporting to {}".format(ramDiskDir, exportDir))
+        return exportDir
+    # End if
+    tmpDir = tempfile.mkdtemp(prefix="svn_select_to_git_", dir=ramDiskDir)
+    atexit.register(shutil.rmtree, tmpDir, True)
+    return os.path.join(tmpDir, os.path.basename(exportDir))
+# End def ramExportDir
+
+def svnURLJoin(url, *parts):
+    """Join path components onto an svn URL.
+    Unlike os.path.join, the separator is always '/' and a component
+    starting with '/' does not discard url"""
+    return "/".join([url.rstrip("/")] + [ x.strip("/") for x in parts ])
+# End def svnURLJoin
+
+## Cache of last changed revision (as string) for each svn URL
+lastChangedRevs = {}
+
+## Cache of svn list results (tuple of entries) for each svn URL
+svnListings = {}
 
 def svnList(url):
-    """Call svn list on a  url"""
+    """Call svn list on a  url
+    The last changed revision of each entry comes with the XML listing
+    so it is cached for svnLastChangedRev(s) as well."""
+    if (url in svnListings):
+        return svnListings[url]
+    # End if
     caller = "svnList {}".format(url)
-    slist = checkOutput(["svn", "list", url])
-    entries = []
-    if (slist is not None):
-        for line in slist.splitlines():
-            entries.append(line.rstrip("/"))
-        # End for
+    names = list()
+    revs = {}
+    def addEntry(entry):
+        name = entry.findtext("name")
+        names.append(name)
+        commit = entry.find("commit")
+        if (commit is not None):
+            revs[svnURLJoin(url, name)] = commit.get("revision")
+        # End if
+    # End def addEntry
+    entries = ()
+    if (xmlEntries(["svn", "list", "--xml", url], addEntry)):
+        entries = tuple(names)
+        svnListings[url] = entries
+        lastChangedRevs.update(revs)
     # End if
 
     return entries
@@ -361,14 +790,19 @@ def svnList(url):
 
 def svnLastChangedRev(url):
     """Find the last commit to url"""
+    if (url in lastChangedRevs):
+        return lastChangedRevs[url]
+    # End if
     caller = "svnLastChangedRev {}".format(url)
     lines = checkOutput(["svn", "info", url])
     rev = ''
     if (lines is not None):
+        matchLastChange = reLastChange.match
         for line in lines.splitlines():
-            match = reLastChange.match(line)
+            match = matchLastChange(line)
             if (match is not None):
                 rev = match.group(1)
+                lastChangedRevs[url] = rev
                 break
             # End if
         # End for
@@ -376,103 +810,229 @@ def svnLastChangedRev(url):
     return rev
 # End def svnLastChangedRev
 
+def svnInfoBatch(urls):
+    """Cache the last commit to each URL in urls from one 'svn info --xml' call.
+    Nothing is cached unless every URL is in the result."""
+    commits = list()
+    def addEntry(entry):
+        commit = entry.find("commit")
+        if (commit is not None):
+            commits.append(commit.get("revision"))
+        else:
+            commits.append(None)
+        # End if
+    # End def addEntry
+    if (xmlEntries(["svn", "info", "--xml"] + urls, addEntry) and
+        (len(commits) == len(urls))):
+        for url, rev in zip(urls, commits):
+            if (rev is not None):
+                lastChangedRevs[url] = rev
+            # End if
+        # End for
+    # End if
+# End def svnInfoBatch
+
+def svnLastChangedRevs(urls, batchSize=100, workers=1):
+    """Find the last commit to each URL in urls
+    URLs are queried in batches with a single 'svn info --xml' call each.
+    Any URL missing from a batch result is looked up on its own.
+    Up to workers svn commands are run at the same time."""
+    todo = [ x for x in urls if x not in lastChangedRevs ]
+    batches = [ todo[x:x+batchSize] for x in range(0, len(todo), batchSize) ]
+    threadMap(svnInfoBatch, batches, workers)
+    todo = [ x for x in todo if x not in lastChangedRevs ]
+    revs = dict(zip(todo, threadMap(svnLastChangedRev, todo, workers)))
+    return [ lastChangedRevs[x] if x in lastChangedRevs else revs[x] for x in urls ]
+# End def svnLastChangedRevs
+
+def svnTagCacheFile(cacheDir, tagURL):
+    "Return the name of the file in cacheDir holding cached results for tagURL"
+    return os.path.join(cacheDir, hashlib.sha1(tagURL.encode("utf-8")).hexdigest() + ".json")
+# End def svnTagCacheFile
+
+def svnLoadTagCache(cacheDir, tagURL):
+    """Load the tag listing of tagURL and the tag revisions saved by
+    svnSaveTagCache into the svn caches unless tagURL has changed since.
+    Return the last changed revision of tagURL"""
+    rootRev = svnLastChangedRev(tagURL)
+    cacheFile = svnTagCacheFile(cacheDir, tagURL)
+    if rootRev and os.path.exists(cacheFile):
+        try:
+            with open(cacheFile) as cfile:
+                data = json.load(cfile)
+            # End with
+        except (IOError, ValueError) as e:
+            print("WARNING: Ignoring bad cache file, {}: {}".format(cacheFile, e))
+            data = None
+        # End try
+        if data and (data.get("rev") == rootRev):
+            svnListings[tagURL] = tuple(data["list"])
+            lastChangedRevs.update(data["revs"])
+        # End if
+    # End if
+    return rootRev
+# End def svnLoadTagCache
+
+def svnSaveTagCache(cacheDir, tagURL, rootRev, tagURLs):
+    """Save the tag listing of tagURL and the revisions of tagURLs
+    (if known) as of revision rootRev of tagURL"""
+    if (not rootRev) or (tagURL not in svnListings):
+        return
+    # End if
+    revs = dict([ (x, lastChangedRevs[x]) for x in tagURLs if x in lastChangedRevs ])
+    data = { "url" : tagURL, "rev" : rootRev,
+             "list" : list(svnListings[tagURL]), "revs" : revs }
+    if (not os.path.isdir(cacheDir)):
+        os.makedirs(cacheDir)
+    # End if
+    # Write a new file then replace the old one so readers never see a partial file
+    cacheFile = svnTagCacheFile(cacheDir, tagURL)
+    with open(cacheFile + ".new", "w") as cfile:
+        json.dump(data, cfile, indent=1, sort_keys=True)
+    # End with
+    os.rename(cacheFile + ".new", cacheFile)
+# End def svnSaveTagCache
+
+def resolveAuthor(who, auth_table, svn_auth, default_author):
+    "Return the git author to use for svn author, who"
+    if auth_table is not None:
+        if who in auth_table:
+            who = auth_table[who]
+        elif default_author is not None:
+            print("WARNING: Author, '{}', not found in author table, substituting '{}'".format(who,default_author))
+            auth_table[who] = default_author
+            who = default_author
+        else:
+            print("WARNING: Author, '{}', not found in author table, guessing author info".format(who))
+
+            #Is svn author an email? Search for "@" to find out:
+            #--------------------------------------------------
+            at_idx = who.find("@")
+
+            if at_idx != -1:
+                #If an email, set start of email as "name":
+                who = "{} : <{}>".format(who[:at_idx],who)
+            else:
+                #If not an email, add a fake one to keep git happy:
+                who = "{} : <missing_email@missing.email>".format(who)
+            #--------------------------------------------------
+    elif not svn_auth:
+        who = None
+    # No else, just keep svn who
+    # End if
+    return who
+# End def resolveAuthor
+
 def svnCaptureLog(repoURL, revstr, auth_table, svn_auth, keep_dates, tag=None, default_author=None, \
-                  tag_rev_list=None, tag_str_list=None):
+                  tag_rev_list=None, tag_str_list=None, tag_rev_ints=None, tag_strs=None,
+                  range_ends=None):
+    """Capture the svn log entries of repoURL for revstr
+    (None if svn log fails).
+    revstr may also be a list of ascending revision ranges, fetched together
+    Tags are given either as tag_rev_list and tag_str_list (as found)
+    or already sorted by sortTags as tag_rev_ints and tag_strs
+    range_ends, if present, is a sorted list of the last revisions of the
+    requested ranges. The last entry of each range may take any later tag,
+    just as the last entry of a range captured on its own does."""
     logs = []
     caller = "svnCaptureLog {} {}".format(repoURL, revstr)
-    log = checkOutput(["svn", "log", "--stop-on-copy", "-r{}".format(revstr), repoURL])
-    nlines = 0
-    lines = []
-    skip = False
-    if (log is not None):
-        line_cnt = 0                 #initalize counter
-        log_lines = log.splitlines() #create list of log lines
-        for line in log_lines:
-            line_cnt = line_cnt + 1 #add one to counter
-            match = reRevis.match(line)
-            if ((not skip) and (nlines > 0)):
-                lines.append(line)
-                nlines = nlines - 1
-                if (nlines == 0):
-                    #Does tag list exist?
-                    #---------------------
-                    if tag_rev_list is not None:
-                        #If so, then search for tag nearest to revision:
-                        rev_idx = tag_rev_search(rev, rev_next, tag_rev_list)
-
-                        #Does a tag revision match current revision?
-                        if rev_idx != -1:
-                            #If so, then set tag string:
-                            tag_str = tag_str_list[rev_idx]
-                        else:
-                            #If not, set tag string to None:
-                            tag_str = None
-                    else:
-                        #If no tag list is present, set tag labels to None:
-                        tag_str = None
-                    #---------------------
-
-                    logs.append(SvnLogEntry(rev, who, when, repoURL, lines, tag=tag_str))
-                    del(lines[:])
-                    lines = []
-                # End if
-            elif (match is not None):
+    if isinstance(revstr, list):
+        revargs = [ "-r{}".format(x) for x in revstr ]
+    else:
+        revargs = [ "-r{}".format(revstr) ]
+    # End if
+    proc = pipeCommand(["svn", "log", "--stop-on-copy"] + revargs + [repoURL])
+    # Read the log as it arrives, svn log messages are always LF-normalized.
+    # Each complete entry, (rev, who, when, message lines), is kept with
+    # the revision of the next header which bounds the tags that apply.
+    entries = []
+    authors = {}     # svn author --> resolved author, warn once per author
+    matchRevis = reRevis.match
+    entry = None     # Entry whose message is being read
+    complete = None  # Complete entry waiting for the next header
+    remaining = 0    # Number of message lines still to read for entry
+    skip = False     # True for the blank line after a header
+    for line in splitLines(proc.stdout):
+        if skip:
+            skip = False
+        elif (remaining > 0):
+            # This line is part of a log message even if it looks like a header
+            entry[3].append(line)
+            remaining = remaining - 1
+            if (remaining == 0):
+                complete = entry
+            # End if
+        elif line.startswith("r"):
+            # Only a header line (r<N> | who | when | N lines) can match
+            match = matchRevis(line)
+            if match:
                 rev = match.group(1).strip()
+                if complete is not None:
+                    entries.append((complete, rev))
+                    complete = None
+                # End if
                 who = match.group(2).strip()
-                #Look ahead for next revision:
-                #----------------------------
-                if line_cnt < len(log_lines)-1:
-                    #If not at end of log, search ahead:
-                    rev_next = next_revision_val(log_lines[line_cnt:])
+                if who in authors:
+                    who = authors[who]
                 else:
-                    #If at end of log, set next revision to gigantic number:
-                    rev_next = sys.maxsize
-                #----------------------------
- 
-                if auth_table is not None:
-                    if who in auth_table:
-                        who = auth_table[who]
-                    elif default_author is not None:
-                        print("WARNING: Author, '{}', not found in author table, substituting '{}'".format(who,default_author))
-                        auth_table[who] = default_author
-                        who = default_author
-                    else:
-                        print("WARNING: Author, '{}', not found in author table, guessing author info".format(who))
-
-                        #Is svn author an email? Search for "@" to find out:
-                        #--------------------------------------------------
-                        at_idx = who.find("@")
-
-                        if at_idx != -1:
-                            #If an email, set start of email as "name":
-                            who_name  = who[:at_idx]
-                            who_new   = "{} : <{}>".format(who_name,who)
-
-                            #re-name variable:
-                            who = who_new
-                        else:
-                            #If not an email, add a fake one to keep git happy:
-                            who_new = "{} : <missing_email@missing.email>".format(who)
-
-                            #re-name variable:
-                            who = who_new
-                        #--------------------------------------------------
-                elif not svn_auth:
-                    who = None
-                # No else, just keep svn who
+                    svn_who = who
+                    who = resolveAuthor(who, auth_table, svn_auth, default_author)
+                    authors[svn_who] = who
                 # End if
                 if keep_dates:
                     when = match.group(3).split('(')[0].strip()
                 else:
                     when = None
                 # End if
-                nlines = int(match.group(4))
-                skip = True # Skip the blank line after a match
-            else:
-                # just discard this line
-                skip = False
+                # Entries without a message are skipped
+                remaining = int(match.group(4))
+                entry = (rev, who, when, [])
+                skip = True
             # End if
+        # End if
+    # End for
+    if complete is not None:
+        #If at end of log, set next revision to gigantic number:
+        entries.append((complete, sys.maxsize))
+    # End if
+    proc.stdout.close()
+    if (proc.wait() == 0):
+        if (tag_rev_list is not None) and (tag_rev_ints is None):
+            #Sort tags by revision once for all searches below:
+            (tag_rev_ints, tag_strs) = sortTags(tag_rev_list, tag_str_list)
+        # End if
+        for ((rev, who, when, message), rev_next) in entries:
+            #Does tag list exist?
+            #---------------------
+            if tag_rev_ints is not None:
+                #Is this the last entry of a requested range?
+                if (range_ends and (rev_next != sys.maxsize)):
+                    end_idx = bisect.bisect_left(range_ends, int(rev))
+                    if ((end_idx < len(range_ends)) and (range_ends[end_idx] < int(rev_next))):
+                        rev_next = sys.maxsize
+                    # End if
+                # End if
+
+                #Search for tag nearest to revision:
+                rev_idx = tag_rev_search(rev, rev_next, tag_rev_ints)
+
+                #Does a tag revision match current revision?
+                if rev_idx != -1:
+                    #If so, then set tag string:
+                    tag_str = tag_strs[rev_idx]
+                else:
+                    #If not, set tag string to None:
+                    tag_str = None
+            else:
+                #If no tag list is present, set tag labels to None:
+                tag_str = None
+            #---------------------
+
+            logs.append(SvnLogEntry(rev, who, when, repoURL, message,
+                                    tag=tag_str))
         # End for
+    else:
+        logs = None
     # End if
     return logs
 # End def svnCaptureLog
@@ -485,29 +1045,39 @@ def parseAuthorTable(filename):
     try:
         with open(filename) as f:
             for line in f:
-                entry = line.split(':')
-                if len(entry) == 2:
-                    auth_table[entry[0].strip()] = entry[1].strip()
-                elif len(entry) != 1:
-                    raise ValueError("Bad author table entry, '{}'".format(line))
+                (svn_who, sep, git_who) = line.partition(':')
+                if (len(sep) == 0):
+                    if (len(line.strip()) > 0):
+                        print("Ignoring incorrectly formatted author entry, '{}'".format(line.strip()))
+                    # End if (blank lines are just skipped)
+                elif (':' in git_who):
+                    raise ValueError("Bad author table entry, '{}'".format(line.strip()))
                 else:
-                    print("Ignoring incorrectly formatted author entry, '{}'".format(line.strip()))
-    except ValueError as e:
-        perr(e)
-    except Exception as e:
-        perr(e)
+                    auth_table[svn_who.strip()] = git_who.strip()
+                # End if
+            # End for
+        # End with
+    except (IOError, ValueError) as e:
+        perr("Error reading author table, '{}': {}".format(filename, e))
+    # End try
 
     return auth_table
 # End parseAuthorTable
 
-def tag_rev_search(rev, rev_next, tag_rev_list):
+def sortTags(tag_rev_list, tag_str_list):
+    """Return (tag_rev_ints, tag_strs), the tag revisions as sorted integers
+    and the matching tag names, skipping tags whose revision is unknown"""
+    tag_pairs = sorted([ (int(x), y) for x, y in zip(tag_rev_list, tag_str_list) if x ],
+                       key=lambda x: x[0])
+    return ([ x[0] for x in tag_pairs ], [ x[1] for x in tag_pairs ])
+# End def sortTags
+
+def tag_rev_search(rev, rev_next, tag_rev_ints):
     """This function is designed to search for the tag
       revision closest to, but after, the current trunk
       or branch revision, while also checking that no revisions
-      are between the current revision and the tag revision"""
-
-    #Convert tag revisions to integers:
-    tag_rev_ints = map(int,tag_rev_list)
+      are between the current revision and the tag revision.
+      tag_rev_ints must be a sorted list of integer tag revisions"""
 
     #Convert current revision to integer
     curr_rev_int = int(rev)
@@ -515,124 +1085,100 @@ def tag_rev_search(rev, rev_next, tag_rev_list):
     #Convert next revision to integer:
     rev_next_int = int(rev_next)
 
-    #Ignore all tag revisions less than current revision:
-    tag_abv_list = [rev for rev in tag_rev_ints if rev >= curr_rev_int]
-
-    #Find revision closest to current revision:
-    tag_rev_close = min(tag_abv_list, key=lambda x: x-curr_rev_int)
+    #Find first tag revision not less than current revision:
+    rev_idx = bisect.bisect_left(tag_rev_ints, curr_rev_int)
 
     #Determine if closest tag revision is in-between current revision and
     #next trunk/branch revision:
-    if tag_rev_close < rev_next_int:
-        #If so, then find list index of tag:
-        rev_idx = tag_rev_ints.index(tag_rev_close)
-    else:
+    if (rev_idx >= len(tag_rev_ints)) or (tag_rev_ints[rev_idx] >= rev_next_int):
         #If not, then set rev_idx to "-1", which indicates tag doesn't exist for this revision:
         rev_idx = -1
 
     #return tag revision index:
     return rev_idx
 
-def next_revision_val(log_lines):
-    """This function searches for the next revision
-       in the subversion logs inside a loop of the
-       logs themselves, which is needed to assign
-       tags properly."""
-
-    #Initalize next revision:
-    rev_next = sys.maxsize
-
-    #Loop over log lines:
-    for line in log_lines:
-
-        #Search for match:
-        match = reRevis.match(line)
-
-        if match is not None:
-            #If match is present, pull out revision
-            rev_next = match.group(1).strip()
-            #break out of loop:
-            break
-
-    #Send next revision back:
-    return rev_next
-
 ##############################
 ###
 ### git Functions
 ###
 ##############################
 
+## Results of git queries for each repository, {realpath : {key : value}}
+## Cleared by gitRepoChanged whenever a helper may move HEAD or create refs
+gitQueryCache = {}
+
+def gitRepoCache(repo):
+    "Return the (mutable) query cache dictionary for repo"
+    return gitQueryCache.setdefault(os.path.realpath(repo), {})
+# End gitRepoCache
+
+def gitRepoChanged(repo):
+    "Forget all cached query results for repo"
+    gitQueryCache.pop(os.path.realpath(repo), None)
+# End gitRepoChanged
+
 # Return the (current branch, sha1 hash) of working copy in wdir
 def gitCurrentBranch(wdir):
     caller = "gitCurrentBranch {}".format(wdir)
-    currdir = os.getcwd()
-    os.chdir(wdir)
-    branch = checkOutput(["git", "symbolic-ref", "--short", "HEAD"])
+    cache = gitRepoCache(wdir)
+    if "branch" in cache:
+        return cache["branch"]
+    # End if
+    branch = checkOutput(["git", "symbolic-ref", "--short", "HEAD"], cwd=wdir)
     if ((branch is None) or (len(branch) == 0)):
         hash = None
     else:
         branch = branch.rstrip()
-        hash = checkOutput(["git", "rev-parse", "HEAD"])
+        hash = checkOutput(["git", "rev-parse", "HEAD"], cwd=wdir)
     # End if
     if (hash is not None):
         hash = hash.rstrip()
     # End if
-    os.chdir(currdir)
+    cache["branch"] = (branch, hash)
     return (branch, hash)
 # End gitCurrentBranch
 
-def gitRefType(chkdir, ref):
-    """Determine if 'ref' is a local branch, a remote branch, a tag, or a commit
-    Should probably use this command instead"""
-    #  git show-ref --verify --quiet refs/heads/<branch-name>
-
-    caller = "gitRefType {} {}".format(chkdir, ref)
-    currdir = os.getcwd()
-    os.chdir(chkdir)
-    refType = gitRef.unknown
-    # First check for local branch
-    gitout = checkOutput(["git", "branch"])
-    if gitout is not None:
-        branches = [ x.lstrip('* ') for x in gitout.splitlines() ]
-        for branch in branches:
-            if branch == ref:
-                refType = gitRef.localBranch
-                break
-            # End if
-        # End for
-    # End if
-    # Next, check for remote branch
-    if refType == gitRef.unknown:
-        gitout = checkOutput(["git", "branch", "-r"])
-        if gitout is not None:
-            for branch in gitout.splitlines():
-                match = reRemoteBranch.match(branch)
-                if (match is not None) and (match.group(1) == ref):
-                    refType = gitRef.remoteBranch
-                    break
-                # End if
-            # End for
-        # End if
+def gitListRefs(chkdir):
+    """Return a dictionary of all branch and tag names in chkdir
+    with their gitRef type, from a single 'git for-each-ref' call.
+    A name which is both a local branch and a tag maps to localBranch.
+    Results are cached until gitRepoChanged(chkdir) is called"""
+    cache = gitRepoCache(chkdir)
+    if "refs" in cache:
+        return cache["refs"]
     # End if
-    # Next, check for a tag
-    if refType == gitRef.unknown:
-        gitout = checkOutput(["git", "tag"])
-        if gitout is not None:
-            for tag in gitout.splitlines():
-                if tag == ref:
-                    refType = gitRef.tag
+    refs = {}
+    gitout = checkOutput(["git", "for-each-ref", "--format=%(refname)"], cwd=chkdir)
+    if gitout is not None:
+        prefixes = [ ("refs/heads/", gitRef.localBranch),
+                     ("refs/remotes/origin/", gitRef.remoteBranch),
+                     ("refs/tags/", gitRef.tag) ]
+        for refname in gitout.splitlines():
+            for prefix, refType in prefixes:
+                if refname.startswith(prefix):
+                    name = refname[len(prefix):]
+                    # Lower gitRef values take precedence
+                    if refType < refs.get(name, gitRef.sha1):
+                        refs[name] = refType
+                    # End if
                     break
                 # End if
             # End for
-        # End if
+        # End for
+        cache["refs"] = refs
     # End if
+    return refs
+# End gitListRefs
+
+def gitRefType(chkdir, ref):
+    """Determine if 'ref' is a local branch, a remote branch, a tag, or a commit"""
+    caller = "gitRefType {} {}".format(chkdir, ref)
+    refType = gitListRefs(chkdir).get(ref, gitRef.unknown)
     # Finally, see if it just looks like a commit hash
     if (refType == gitRef.unknown) and reGitHash.match(ref):
         refType = gitRef.sha1
     # End if
 
-    os.chdir(currdir)
     # Return what we've come up with
     return refType
 # End gitRefType
@@ -642,19 +1188,20 @@ def gitCheckDir(chkdir, ref=None):
     returns True (correct), False (incorrect) or None (chkdir not found)"""
 
     caller = "gitCheckDir {} {}".format(chkdir, ref)
-    currdir = os.getcwd()
     if (os.path.exists(chkdir)):
         if (os.path.exists(os.path.join(chkdir, ".git"))):
-            os.chdir(chkdir)
-            head = checkOutput(["git", "rev-parse", "HEAD"])
+            cache = gitRepoCache(chkdir)
+            if ("HEAD" not in cache):
+                cache["HEAD"] = checkOutput(["git", "rev-parse", "HEAD"], cwd=chkdir)
+            # End if
+            head = cache["HEAD"]
         else:
             head = None
         # End if
         if (ref is None):
             refchk = None
         else:
-            os.chdir(chkdir)
-            refchk = checkOutput(["git", "rev-parse", ref])
+            refchk = checkOutput(["git", "rev-parse", ref], cwd=chkdir)
         # End if
         if (ref is None):
             retVal = head is not None
@@ -666,42 +1213,26 @@ def gitCheckDir(chkdir, ref=None):
     else:
         retVal = None
     # End if
-    os.chdir(currdir)
     return retVal
 # End gitCheckDir
 
 def gitWdirClean(wdir):
     caller = "getWdirClean {}".format(wdir)
-    currdir = os.getcwd()
-    os.chdir(wdir)
-    retcode = retcall(["git", "diff", "--quiet", "--exit-code"])
-    os.chdir(currdir)
+    retcode = retcall(["git", "diff", "--quiet", "--exit-code"], cwd=wdir)
     return (retcode == 0)
 # End def gitWdirClean
 
 def gitNewRepo(repo):
     caller = "gitNewRepo {}".format(repo)
-    currdir = os.getcwd()
-    os.chdir(repo)
-    status = checkOutput(["git", "status"])
-    newrepo = False
-    for line in status.splitlines():
-        if (line.rstrip(os.linesep) == "Initial commit"):
-            newrepo = True
-            break
-        elif (line.rstrip(os.linesep) == "No commits yet"):
-            newrepo = True
-            break
-        # End if
-    # End for
-    os.chdir(currdir)
+    status = checkOutput(["git", "status"], cwd=repo)
+    # Older versions of git say "Initial commit", newer "No commits yet"
+    lines = status.splitlines()
+    newrepo = ("Initial commit" in lines) or ("No commits yet" in lines)
     return newrepo
 # End def gitNewRepo
 
 def gitCheckout(checkoutDir, ref=None):
     caller = "gitCheckout {}".format(checkoutDir)
-    currdir = os.getcwd()
-    os.chdir(checkoutDir)
     retcode = 0
     if (gitCheckDir(checkoutDir) is None):
         perr("gitCheckout: Checkout dir ({}) not found".format(checkoutDir))
@@ -711,48 +1242,101 @@ def gitCheckout(checkoutDir, ref=None):
         (branch, chash) = gitCurrentBranch(checkoutDir)
         refType = gitRefType(checkoutDir, ref)
         if (refType == gitRef.remoteBranch):
-            retcode = scall(["git", "checkout", "--track", "origin/"+ref])
+            retcode = scall(["git", "checkout", "--track", "origin/"+ref], cwd=checkoutDir)
         elif (refType == gitRef.localBranch):
             if ((branch != ref) and (not gitWdirClean(checkoutDir))):
                 perr("Working directory ({}) not clean, aborting".format(checkoutDir))
             else:
-                retcode = scall(["git", "checkout", ref])
+                retcode = scall(["git", "checkout", ref], cwd=checkoutDir)
             # End if
         else:
             # For now, do a hail mary and hope ref can be checked out
-            retcode = scall(["git", "checkout", ref])
+            retcode = scall(["git", "checkout", ref], cwd=checkoutDir)
         # End if
+        gitRepoChanged(checkoutDir)
         quitOnFail(retcode, caller)
     # End if
-    os.chdir(currdir)
 # End def gitCheckout
 
-def gitRmFile(repo, filename):
-    caller = "gitRmFile {} {}".format(repo, filename)
-    currdir = os.getcwd()
-    os.chdir(repo)
-    retcode = retcall(["git", "rm", filename])
-    os.chdir(currdir)
-    quitOnFail(retcode, caller)
-# End def gitRmFile
-
-def gitAddFile(repo, filename):
-    caller = "gitAddFile {} {}".format(repo, filename)
-    currdir = os.getcwd()
-    os.chdir(repo)
+## Cache of git features which depend on the installed git version
+gitFeatures = {}
+
+## Most characters of file names to pass on one git command line
+gitArgChars = 100000
+
+def gitPathspecFromFile():
+    "Return True if git can read pathspecs from stdin (git 2.26 or later)"
+    if "pathspec-from-file" not in gitFeatures:
+        version = checkOutput(["git", "--version"])
+        match = None
+        if (version is not None):
+            match = reGitVersion.match(version)
+        # End if
+        gitFeatures["pathspec-from-file"] = ((match is not None) and
+                                             ((int(match.group(1)), int(match.group(2))) >= (2, 26)))
+    # End if
+    return gitFeatures["pathspec-from-file"]
+# End def gitPathspecFromFile
+
+def gitPathspecCall(repo, gitcmd, filenames):
+    """Run 'git <gitcmd>' on all of filenames, once with the names fed on
+    stdin or, for git older than 2.26, in command lines of limited length.
+    Filenames are literal paths, not glob patterns.
+    Return the command's return code (-1 if it could not be run)"""
+    commands = ["git", "--literal-pathspecs"] + gitcmd
+    if (gitPathspecFromFile()):
+        commands.extend(["--pathspec-from-file=-", "--pathspec-file-nul"])
+        (retcode, output) = runCommand(commands, quiet=True, cwd=repo,
+                                       input="\0".join(filenames))
+    else:
+        chunks = [[]]
+        size = 0
+        for fname in filenames:
+            if (chunks[-1] and (size + len(fname) > gitArgChars)):
+                chunks.append([])
+                size = 0
+            # End if
+            chunks[-1].append(fname)
+            size = size + len(fname) + 1
+        # End for
+        for chunk in chunks:
+            (retcode, output) = runCommand(commands + ["--"] + chunk,
+                                           quiet=True, cwd=repo)
+            if (retcode != 0):
+                break
+            # End if
+        # End for
+    # End if
+    if retcode is None:
+        retcode = -1
+    # End if
+    return retcode
+# End def gitPathspecCall
+
+def gitRmFiles(repo, filenames):
+    if len(filenames) > 0:
+        retcode = gitPathspecCall(repo, ["rm"], filenames)
+        if (retcode != 0):
+            caller = "gitRmFiles {} ({} files)".format(repo, len(filenames))
+            quitOnFail(retcode, caller)
+        # End if
+    # End if
+# End def gitRmFiles
+
+def gitAddFiles(repo, filenames):
     # Since we may have declined to copy a new file (eg., bad symlink)
-    # Make sure the file exists before trying to add it
-    if os.path.exists(filename):
-        retcode = retcall(["git", "add", filename])
-        os.chdir(currdir)
-        quitOnFail(retcode, caller)
+    # Make sure each file exists before trying to add it
+    addfiles = [x for x in filenames if os.path.exists(os.path.join(repo, x))]
+    if len(addfiles) > 0:
+        retcode = gitPathspecCall(repo, ["add"], addfiles)
+        if (retcode != 0):
+            caller = "gitAddFiles {} ({} files)".format(repo, len(addfiles))
+            quitOnFail(retcode, caller)
+        # End if
     # End if
-# End def gitAddFile
+# End def gitAddFiles
 
 def gitCommitAll(repo, message, author=None, date=None):
-    caller = "gitCommitAll {}".format(repo)
-    currdir = os.getcwd()
-    os.chdir(repo)
     gitcmd = ["git", "commit", "-a"]
     if author is not None:
         gitcmd.append("--author='{}'".format(author))
@@ -765,76 +1349,162 @@ def gitCommitAll(repo, message, author=None, date=None):
     full_message = "'"+message+"'"
     gitcmd.append("--message={}".format(full_message))
 
-    retcode = retcall(gitcmd)
-    os.chdir(currdir)
-    quitOnFail(retcode, caller, gitcmd)
+    retcode = retcall(gitcmd, cwd=repo)
+    gitRepoChanged(repo)
+    if (retcode != 0):
+        quitOnFail(retcode, "gitCommitAll {}".format(repo), gitcmd)
+    # End if
+    # Return the new commit's hash
+    hash = checkOutput(["git", "rev-parse", "HEAD"], cwd=repo)
+    if (hash is not None):
+        hash = hash.rstrip()
+    # End if
+    return hash
 # End def gitCommitAll
 
 def gitApplyTag(repo, tag, message):
-    caller = "gitApplyTag {} {}".format(repo, tag)
-    currdir = os.getcwd()
-    os.chdir(repo)
-    retcode = scall(["git", "tag", "-a", tag, "-m", message])
-    os.chdir(currdir)
-    quitOnFail(retcode, caller)
+    retcode = scall(["git", "tag", "-a", tag, "-m", message], cwd=repo)
+    gitRepoChanged(repo)
+    if (retcode != 0):
+        quitOnFail(retcode, "gitApplyTag {} {}".format(repo, tag))
+    # End if
 # End def gitApplyTag
 
 def gitCaptureLog(repo):
+    """Return the svn log entries of the commits in repo's current branch
+    (newest first). The result is cached until gitRepoChanged(repo)"""
+    cache = gitRepoCache(repo)
+    if "log" in cache:
+        return cache["log"]
+    # End if
     logs = []
     caller = "gitCaptureLog {}".format(repo)
-    currdir = os.getcwd()
-    os.chdir(repo)
-    log = checkOutput(["git", "log"])
-    status = 0
-    if (log is not None):
-        for line in log.splitlines():
-            match = reCommit.match(line)
-            if (match is not None):
-                # A commit line should be the first in a new message
-                if (status != 0):
-                    # We are going to just ignore bad or non-svn commits for now
-                    status = 0
-                # End if
-                commit = match.group(1)
-                status = status + 8
-            # End if
-            match = reImport.match(line)
+    # Read the log as it arrives rather than holding all of it in memory
+    proc = pipeCommand(["git", "log"], cwd=repo)
+    matchCommit = reCommit.match
+    matchImport = reImport.match
+    matchAuthor = reAuthor.match
+    # Fields of the current commit, commit is None between svn commits
+    commit = rev = who = when = None
+    # Cheap substring tests skip the regexes for most message lines
+    for line in splitLines(proc.stdout):
+        if line.startswith("commit "):
+            match = matchCommit(line)
+        else:
+            match = None
+        # End if
+        if (match is not None):
+            # A commit line starts a new message, we are going to just
+            # ignore bad or non-svn commits (missing info) for now
+            commit = match.group(1)
+            rev = who = when = None
+            continue
+        elif (commit is None):
+            continue
+        # End if
+        if ((rev is None) and ("Imported from " in line)):
+            match = matchImport(line)
             if (match is not None):
                 rev = match.group(1)
-                status = status + 4
             # End if
-            match = reAuthor.match(line)
+        # End if
+        if ((who is None) and (cby_str in line)):
+            match = matchAuthor(line)
             if (match is not None):
                 who = match.group(1)
                 when = match.group(2)
-                status = status + 3
             # End if
-            # See if we have a complete commit to flush
-            if (status == 15):
-                logs.append(Git2svnLogEntry(commit, rev, who, when, repo))
-                status = 0
-            # End if
-        # End for
+        # End if
+        # See if we have a complete commit to flush
+        if ((rev is not None) and (who is not None)):
+            logs.append(Git2svnLogEntry(commit, rev, who, when, repo))
+            commit = None
+        # End if
+    # End for
+    proc.stdout.close()
+    if (proc.wait() != 0):
+        # No log (e.g., no commits yet)
+        logs = []
     # End if
-    os.chdir(currdir)
+    cache["log"] = logs
     return logs
 # End gitCaptureLog
 
-def findParentCommit(gitLog, svnRev):
-  "Find the commit with the closest (but not larger) svn revision"
-  rnum = int(svnRev)
-  commit = None
-  # The log should be in inverse order so stop at first hit
-  for log in gitLog:
-    gnum = log.revNum()
-    if (gnum < rnum):
-      commit = log.commit()
-      break
-    # End if
-  # End for
+def findParentCommit(gitLog, svnRev, revNums=None):
+  """Find the commit with the closest (but not larger) svn revision
+  gitLog is in inverse order (newest first). revNums, if present, is the
+  ascending list of gitLog's svn revision numbers (i.e., reversed)"""
+  if revNums is None:
+    revNums = [ log.revNum() for log in reversed(gitLog) ]
+  # End if
+  # Find the last log with a smaller revision number
+  idx = bisect.bisect_left(revNums, int(svnRev)) - 1
+  if (idx >= 0):
+    commit = gitLog[len(gitLog) - 1 - idx].commit()
+  else:
+    commit = None
+  # End if
   return commit
 # End def findParentCommit
 
+# Version of the migration state file layout written by gitSaveRevs
+gitStateVersion = 1
+
+# Number of new commits between saves of the migration state. A state
+# saved before the last commits has an old HEAD, so the next run just
+# falls back to reading the git log
+gitStateInterval = 100
+
+def gitStateFile(repo):
+    "Return the name of the file (kept out of the work tree) holding repo's migration state"
+    return os.path.join(repo, ".git", "svn_select_to_git_state.json")
+# End def gitStateFile
+
+def gitLoadState(repo):
+    "Return the migration state saved in repo (an empty state if none)"
+    stateFile = gitStateFile(repo)
+    data = None
+    if os.path.exists(stateFile):
+        try:
+            with open(stateFile) as sfile:
+                data = json.load(sfile)
+            # End with
+        except (IOError, ValueError) as e:
+            print("WARNING: Ignoring bad state file, {}: {}".format(stateFile, e))
+        # End try
+    # End if
+    if (not isinstance(data, dict)) or (data.get("version") != gitStateVersion):
+        data = { "version" : gitStateVersion, "branches" : {} }
+    # End if
+    return data
+# End def gitLoadState
+
+def gitLoadRevs(state, branch, head):
+    """Return the sorted list of svn revisions in state (from gitLoadState)
+    for branch or None if there are none or they were saved for a
+    different HEAD commit than head"""
+    entry = state["branches"].get(branch)
+    if entry and (head is not None) and (entry.get("head") == head):
+        return sorted(entry["revs"])
+    # End if
+    return None
+# End def gitLoadRevs
+
+def gitSaveRevs(repo, state, branch, head, revs):
+    """Save revs, the sorted list of svn revisions in branch as of its
+    HEAD commit, head, in state (from gitLoadState) and repo's state file"""
+    if head is None:
+        return
+    # End if
+    state["branches"][branch] = { "head" : head, "revs" : revs }
+    # Write a new file then replace the old one so readers never see a partial file
+    stateFile = gitStateFile(repo)
+    with open(stateFile + ".new", "w") as sfile:
+        json.dump(state, sfile)
+    # End with
+    os.replace(stateFile + ".new", stateFile)
+# End def gitSaveRevs
+
 def gitSetupDir(chkdir, repo, branch, rev, repoURL, auth_table, svn_author, preserve_dates, default_author):
     """
     Check to see if directory (chkdir) exists and is okay to use
@@ -842,49 +1512,50 @@ def gitSetupDir(chkdir, repo, branch, rev, repoURL, auth_table, svn_author, pres
     returns True unless directory exists but is not correct"""
     caller = "gitSetupDir {}".format(chkdir)
     dirOK = True
-    currdir = os.getcwd()
+    # HEAD may move and branches may be created below
+    gitRepoChanged(chkdir)
     if (branch != "master"):
         if ((not os.path.exists(chkdir)) or
             (not os.path.exists(os.path.join(chkdir, ".git")))):
             perr("ERROR: git repo must exist to create branch {}".format(branch))
         else:
-            os.chdir(chkdir)
-            dirOK = (retcall(["git", "checkout", branch]) == 0)
+            dirOK = (retcall(["git", "checkout", branch], cwd=chkdir) == 0)
             if (not dirOK):
                 # We don't have a branch, better create it
-                dirOK = (retcall(["git", "checkout", "master"]) == 0)
+                dirOK = (retcall(["git", "checkout", "master"], cwd=chkdir) == 0)
+                gitRepoChanged(chkdir)
                 if (dirOK):
                     # We have to figure out where to start this branch
                     gitLog = gitCaptureLog(chkdir)
-                    logs = list()
+                    # Find the first revision in range with one svn log call
+                    # (not '--limit 1', entries without a message are dropped)
                     revstart = rev.revStart()
-                    while len(logs) < 1:
-                        logs = svnCaptureLog(repoURL, revstart, auth_table, svn_author, preserve_dates, default_author=default_author)
-                        if len(logs) < 1:
-                            revstart = revstart + 1
-                            if revstart > rev.revEnd():
-                                perr("No commits in range {} to {}".format(rev.revStart(), rev.revEnd()))
-                            # End if
-                        # End if
-                    # End while
-                    branchRev = logs[len(logs) - 1].revision()
+                    if (rev.revEnd() > revstart):
+                        revstr = "{}:{}".format(revstart, rev.revEnd())
+                    else:
+                        revstr = revstart
+                    # End if
+                    logs = svnCaptureLog(repoURL, revstr, auth_table, svn_author, preserve_dates,
+                                         default_author=default_author)
+                    if not logs:
+                        perr("No commits in range {} to {}".format(rev.revStart(), rev.revEnd()))
+                    # End if
+                    revstart = logs[0].revNum()
                     commit = findParentCommit(gitLog, revstart)
                     if commit is None:
                         perr("No appropriate master commit to start branch {}".format(branch))
                     else:
-                        dirOK = (retcall(["git", "branch", branch, str(commit)]) == 0)
+                        dirOK = (retcall(["git", "branch", branch, str(commit)], cwd=chkdir) == 0)
                     # End if
                 else:
                     perr("ERROR: master must exist to create branch {}".format(branch))
                 # End if
             # End if
-            os.chdir(currdir)
         # End if
     # End if (branch != master)
     if (os.path.exists(chkdir)):
         if (os.path.exists(os.path.join(chkdir, ".git"))):
-            os.chdir(chkdir)
-            dirOK = (retcall(["git", "checkout", branch]) == 0)
+            dirOK = (retcall(["git", "checkout", branch], cwd=chkdir) == 0)
 # XXgoldyXX: v debug only
 # Should not have to do this
 #            if (not dirOK):
@@ -898,17 +1569,15 @@ def gitSetupDir(chkdir, repo, branch, rev, repoURL, auth_table, svn_author, pres
         # We need to make sure chkdir's parent exists
         parent = os.path.realpath(os.path.join(chkdir, ".."))
         if (not os.path.exists(parent)):
-            os.mkdirs(parent)
+            os.makedirs(parent)
         # End if
-        os.chdir(parent)
-        dirOK = (retcall(["git", "init",  "--quiet", chkdir]) == 0)
+        dirOK = (retcall(["git", "init",  "--quiet", chkdir], cwd=parent) == 0)
         if (dirOK):
-            os.chdir(chkdir)
-            dirOK = (retcall(["git", "checkout", "-b", "master"]) == 0)
+            dirOK = (retcall(["git", "checkout", "-b", "master"], cwd=chkdir) == 0)
         # End if
     # End if
 
-    os.chdir(currdir)
+    gitRepoChanged(chkdir)
     return dirOK
 # End def gitSetupDir
 
@@ -918,99 +1587,156 @@ def gitSetupDir(chkdir, repo, branch, rev, repoURL, auth_table, svn_author, pres
 ###
 ##############################
 
-def FindTreeOrphans(dir1, dir2):
-  "Provide lists of files which show up in one directory but not the other"
-  groot = os.path.join(".", ".git")
-  orphans = []
-  currdir = os.getcwd()
-  os.chdir(dir1)
-  for root, dirs, files in os.walk("."):
-    if (root[0:len(groot)] != groot):
-      for file in files:
-        fname = os.path.join(root, file).lstrip("./")
-        if (not os.path.exists(os.path.join(dir2, fname))):
-          orphans.append(fname)
-        # End if
-      # End for
+## Top-level administrative directories which treeFiles skips
+adminDirs = (".git", ".svn")
+
+def treeFiles(topdir):
+  """Return the set of file paths under topdir (relative to topdir), skipping
+  the .git and .svn (svnUpdate working copy) administrative directories
+  Like os.walk, symbolic links to directories are neither listed nor followed"""
+  files = set()
+  # (directory, its path relative to topdir with a trailing separator) to scan
+  todo = [(topdir, "")]
+  while todo:
+    (dirpath, relpath) = todo.pop()
+    try:
+      entries = list(os.scandir(dirpath))
+    except OSError:
+      # os.walk also skips directories it cannot read
+      continue
+    # End try
+    for entry in entries:
+      name = relpath + entry.name
+      try:
+        isdir = entry.is_dir()
+      except OSError:
+        isdir = False
+      # End try
+      if (not isdir):
+        files.add(name)
+      elif (not entry.is_symlink()) and (name not in adminDirs):
+        todo.append((entry.path, name + os.sep))
+      # End if
+    # End for
+  # End while
+  return files
+# End treeFiles
+
+def FindTreeOrphans(dir1, dir2, files1=None, files2=None):
+  """Provide lists of files which show up in one directory but not the other
+  files1 and files2, if present, are treeFiles(dir1) and treeFiles(dir2)"""
+  if files1 is None:
+    files1 = treeFiles(dir1)
+  # End if
+  if files2 is None:
+    files2 = treeFiles(dir2)
+  # End if
+  return sorted(files1 - files2), sorted(files2 - files1)
+# End FindTreeOrphans
+
+def copySvn2Git(svnDir, gitDir, files=None, workers=1):
+  """Copy the files in svnDir to gitDir
+  files, if present, is treeFiles(svnDir) which saves walking svnDir again
+  Up to workers files are compared and copied at the same time"""
+  if files is None:
+    files = treeFiles(svnDir)
+  # End if
+  files = sorted(files)
+  parents = set() # gitDir directories known to exist
+  for file in files:
+    parent = os.path.dirname(os.path.join(gitDir, file))
+    if (parent not in parents):
+      if (not os.path.exists(parent)):
+        os.makedirs(parent)
+      # End if
+      parents.add(parent)
     # End if
   # End for
-  os.chdir(currdir)
-  return orphans
-# End FindTreeOrphans
 
-def copySvn2Git(svnDir, gitDir):
-  "Copy the files in svnDir to gitDir"
-  currdir = os.getcwd()
-  os.chdir(svnDir)
-  num_copies = 0
-  for root, dirs, files in os.walk("."):
-    parent = os.path.join(gitDir, root)
-    if (not os.path.exists(parent)):
-      os.makedirs(parent)
-    # End if
-    for file in files:
-        file1 = os.path.join(root, file)
-        file2 = os.path.join(parent, file)
-        if file_diff(file1, file2):
-            if os.path.islink(file1):
-                pdir = os.path.dirname(file1)
-                # SVN symlinks cannot (correctly) be absolute pathnames
-                plink = os.path.join(pdir, os.readlink(file1))
-                if not os.path.exists(plink):
-                    # Do not try to copy a bad symlink
-                    print("WARNING: Not copying bad symlink, {}".format(plink))
-                    continue
-                # End if
-            # End if
-            num_copies = num_copies + 1
-            shutil.copy2(file1, file2)
-            # End if
+  def copyChanged(file):
+    "Copy file if it has changed, return True if copied or a warning"
+    file1 = os.path.join(svnDir, file)
+    file2 = os.path.join(gitDir, file)
+    if file_diff(file1, file2):
+      if os.path.islink(file1):
+        # SVN symlinks cannot (correctly) be absolute pathnames
+        plink = os.path.join(os.path.dirname(file), os.readlink(file1))
+        if not os.path.exists(os.path.join(svnDir, plink)):
+          # Do not try to copy a bad symlink
+          return "WARNING: Not copying bad symlink, {}".format(os.path.join(os.curdir, plink))
         # End if
-    # End for
+      # End if
+      copyFile(file1, file2)
+      return True
+    # End if
+    return False
+  # End def copyChanged
+
+  num_copies = 0
+  # Warnings are printed in file order whichever thread found them
+  for result in threadMap(copyChanged, files, workers):
+    if (result is True):
+      num_copies = num_copies + 1
+    elif result:
+      print(result)
+    # End if
   # End for
-  os.chdir(currdir)
   return num_copies
 # End def copySvn2Git
 
-def processRevision(exportDir, gitDir, log, external, cam_move):
+def processRevision(exportDir, gitDir, log, external, cam_move, nextLogs=(), manage_mirror=None,
+                    copy_workers=1, svn_update=False, svn_diff=False):
   rnum = log.revision()
   tag = log.tag()
   num_changes = 0
   print("Processing revision {}, tag = {}".format(int(rnum), tag))
-  svnExport(exportDir, log.url(), rnum)
+  # With svn_diff, apply just the changes since the last revision if possible
+  last = svnLastApplied.get(gitDir)
+  if (svn_diff and (last is not None) and (last[0] == log.url()) and
+      svnApplyDiff(gitDir, log.url(), last[1], rnum)):
+    num_changes = 1
+  else:
+    if svn_update:
+      # exportDir is a working copy, only the changes are fetched
+      svnUpdate(exportDir, log.url(), rnum)
+    else:
+      svnExport(exportDir, log.url(), rnum)
+      # Fetch the next revisions from svn while this one is committed
+      for nextLog in nextLogs:
+        svnPrefetch(exportDir, nextLog.url(), nextLog.revision())
+      # End for
+    # End if
 
-  #-----------------------------
-  #Create Externals_CAM.cfg file
-  #-----------------------------
-  if external:
-      #Determine CAM SVN Externals:
-      svn_ext_list = read_svn_externals_cam(exportDir)
-
-      #Create new 'manage_externals' cfg file for CAM:
-      external_cam_cfg_create(svn_ext_list)
-
-  #-----------------------------------------
-  #Move "components/cam" to head of svn repo
-  #-----------------------------------------
-  if cam_move:
-      svn_cam_dir_top_move(exportDir)
-  #-----------------------------------------
-
-  orphans1 = FindTreeOrphans(exportDir, gitDir)
-  orphans2 = FindTreeOrphans(gitDir, exportDir)
-  # Remove files no longer in repo
-  for file in orphans2:
-    gitRmFile(gitDir, file)
-    num_changes = num_changes + 1
-  # End for
-  # Copy the svn export directory into the working git directory
-  # Can't use copytree since the repo directory already exists
-  num_changes = num_changes + copySvn2Git(exportDir, gitDir)
-  # Add files new to the repo
-  for file in orphans1:
-    gitAddFile(gitDir, file)
-    num_changes = num_changes + 1
-  # End for
+    #-----------------------------
+    #Create Externals_CAM.cfg file
+    #-----------------------------
+    if external:
+        #Determine CAM SVN Externals:
+        svn_ext_list = read_svn_externals_cam(exportDir)
+
+        #Create new 'manage_externals' cfg file for CAM:
+        external_cam_cfg_create(svn_ext_list)
+
+    #-----------------------------------------
+    #Move "components/cam" to head of svn repo
+    #-----------------------------------------
+    if cam_move:
+        svn_cam_dir_top_move(exportDir)
+    #-----------------------------------------
+
+    # Walk the svn and git trees at the same time
+    svnFiles, gitFiles = threadMap(treeFiles, [exportDir, gitDir], copy_workers)
+    orphans1, orphans2 = FindTreeOrphans(exportDir, gitDir, svnFiles, gitFiles)
+    # Remove files no longer in repo
+    gitRmFiles(gitDir, orphans2)
+    num_changes = num_changes + len(orphans2)
+    # Copy the svn export directory into the working git directory
+    # Can't use copytree since the repo directory already exists
+    num_changes = num_changes + copySvn2Git(exportDir, gitDir, svnFiles, copy_workers)
+    # Add files new to the repo
+    gitAddFiles(gitDir, orphans1)
+    num_changes = num_changes + len(orphans1)
+  # End if
   # Commit everything
 
   #--------------------------------------
@@ -1024,16 +1750,22 @@ def processRevision(exportDir, gitDir, log, external, cam_move):
       git_external_cfg_cam_add(gitDir, False, "")
 
       #Add "manage_externals" remote to git repository:
-      git_manage_external_add(gitDir)
+      git_manage_external_add(gitDir, manage_mirror)
   #---------------------------------------------
 
+  # The commit and the tag share the same message
+  message = log.formatLogMessage()
+  head = None
   if num_changes > 0:
-    gitCommitAll(gitDir, log.formatLogMessage(), author=log.who(), date=log.when())
+    head = gitCommitAll(gitDir, message, author=log.who(), date=log.when())
   # End if
   if (tag is not None):
     # Apply the tag
-    gitApplyTag(gitDir, tag, log.formatLogMessage())
+    gitApplyTag(gitDir, tag, message)
   # End if
+  svnLastApplied[gitDir] = (log.url(), rnum)
+  # The new HEAD commit (None if there was nothing to commit)
+  return head
 # End def processRevision
 
 ############################################
@@ -1054,86 +1786,68 @@ def read_svn_externals_cam(svndir):
        the SVN_EXTERNAL_DIRECTORIES file
        in the cam sub-directory."""
 
+    #Set CAM's 'SVN_EXTERNAL_DIRECTORIES' file path:
+    svn_ext_filepath = os.path.join(svndir,"components","cam","SVN_EXTERNAL_DIRECTORIES")
+
     #Check if CAM's SVN_EXTERNAL_DIRECTORIES file exists, and is
     #where we think it is:
-    if not os.path.exists(os.path.join(svndir,"components","cam","SVN_EXTERNAL_DIRECTORIES")):
+    if not os.path.isfile(svn_ext_filepath):
         perr("CAM's SVN_EXTERNAL_DIRECTORIES is not present, need to \
               add CAM externals to git manually")
 
-    #Set CAM's 'SVN_EXTERNAL_DIRECTORIES' file path:
-    svn_ext_filepath = os.path.join(svndir,"components","cam","SVN_EXTERNAL_DIRECTORIES")
+    #Initalize list of (label, local path, repository URL, tag) externals:
+    cam_ext_list = []
 
-    #initalize externals list:
-    svn_ext_list = []
-
-    #Read in 'SVN_EXTERNAL_DIRECTORIES_CAM' file data:
+    #Read in 'SVN_EXTERNAL_DIRECTORIES_CAM' file data one line at a time:
     with open(svn_ext_filepath,'r') as svn_ext_fil:
 
-        #Read data to list:
-        svn_ext_list = svn_ext_fil.readlines()
+        #Loop over all CAM externals:
+        for line in svn_ext_fil:
+            #Seperate local path and external URL:
+            path_and_url = line.split()
+
+            #Skip blank lines:
+            if not path_and_url:
+                continue
+
+            path = path_and_url[0]
+            url  = path_and_url[1]
 
-    #Initalize lists:
-    cam_ext_path = []
-    cam_ext_url  = []
+            #Look up label from dictionary
+            label = ext_label_dict[path]
 
-    #Loop over all CAM externals:
-    for line in svn_ext_list:
-        #Seperate local path and external URL:
-        path_and_url = line.split()
+            #Search for "tags" line:
+            tags_exist = url.find("tags")
 
-        #Append external path list:
-        cam_ext_path.append(path_and_url[0].strip())
+            #End script if "tags" string isn't found:
+            if(tags_exist == -1):
+                perr("The 'tags' string is missing in external URL {}".format(url))
 
-        #Append external url list:
-        cam_ext_url.append(path_and_url[1].strip())
+            #Split URL into repository URL and tag:
+            #Note:  Adding five to index to incorporate entire "tags/" string in URL
+            cam_ext_list.append((label, path, url[:(tags_exist+5)], url[(tags_exist+5):]))
 
-    #Return cam external paths (for deletion):
-    return [cam_ext_path,cam_ext_url]
+    #Return cam externals:
+    return cam_ext_list
 
 #+++++++++++++++++++++++
 
+## Externals_CAM.cfg entry for an external, (label, local path, url, tag)
+ext_cfg_entry = ("[{}]\n"
+                 "local_path = {}\n"
+                 "protocol = svn\n"
+                 "repo_url = {}\n"
+                 "tag = {}\n"
+                 "required = True\n"
+                 "\n")
+
 def external_cam_cfg_create(svn_ext_list):
     """Generates a new Externals_CAM.cfg
        file based off the original
        'SVN_EXTERNAL_DIRECTORIES' file in
-       the 'components/cam' subdirectory."""
-
-    #Pull out individual lists:
-    cam_ext_path = svn_ext_list[0]
-    cam_ext_url  = svn_ext_list[1]
-
-    #Iinitalize lists:
-    ext_cfg_labels = []
-    ext_cfg_urls   = []
-    ext_cfg_tags   = []
-
-    #Determine external "labels":
-    #---------------------------
-    for line in cam_ext_path:
-        #Look up label from dictionary
-        label = ext_label_dict[line]
-
-        #Add label to list:
-        ext_cfg_labels.append(label)
-    #--------------------------
-
-    #Determine external URLs and tags:
-    #--------------------------------
-    for line in cam_ext_url:
-        #Search for "tags" line:
-        tags_exist = line.find("tags")
-
-        #End script if "tags" string isn't found:    
-        if(tags_exist == -1):
-            perr("The 'tags' string is missing in external URL {}".format(line))
-    
-        #Determine repository URLs:
-        #Note:  Adding five to index to incorporate entire "tags/" string in URL
-        ext_cfg_urls.append(line[:(tags_exist+5)])
-
-        #Determine repository tag:
-        ext_cfg_tags.append(line[(tags_exist+5):])
-    #--------------------------------
+       the 'components/cam' subdirectory.
+       svn_ext_list is the list of externals
+       from read_svn_externals_cam."""
 
     #Write new "Externals_CAM.cfg" file:
     #----------------------------------
@@ -1152,31 +1866,19 @@ def external_cam_cfg_create(svn_ext_list):
         #Remove file:
         os.remove(cfg_file_path)
 
-    #Create new cfg file:
-    with open(cfg_file_path,'w') as cfg_file:
+    #Build the cfg file contents, one entry per external:
+    cfg_parts = []
+    for (label, path, url, tag) in svn_ext_list:
+        cfg_parts.append(ext_cfg_entry.format(label, path, url, tag))
 
-        #Loop over external label indices:
-        for i in range(len(ext_cfg_labels)): 
-            #Add Externals label:
-            cfg_file.write("["+ext_cfg_labels[i]+"]\n")
-            #Add local path:
-            cfg_file.write("local_path = "+cam_ext_path[i]+"\n")
-            #Add protocol:
-            cfg_file.write("protocol = svn\n")
-            #Add URL:
-            cfg_file.write("repo_url = "+ext_cfg_urls[i]+"\n")
-            #Add tag:
-            cfg_file.write("tag = "+ext_cfg_tags[i]+"\n")
-            #Add "required" statement:
-            cfg_file.write("required = True\n")
-            #Add blank line:
-            cfg_file.write("\n")
-
-        #Add externals description to file:
-        cfg_file.write("[externals_description]\n")
-        cfg_file.write("schema_version = 1.0.0\n")
-        #Add blank line:
-        cfg_file.write("\n")
+    #Add externals description:
+    cfg_parts.append("[externals_description]\n"
+                     "schema_version = 1.0.0\n"
+                     "\n")
+
+    #Create new cfg file (with a single write):
+    with open(cfg_file_path,'w') as cfg_file:
+        cfg_file.write("".join(cfg_parts))
     #----------------------------------
 
 #+++++++++++++++++++++
@@ -1220,89 +1922,80 @@ def git_external_cfg_cam_add(git_dir, git_commit, git_com_msg):
     cam_ext_file  = "Externals_CAM.cfg"
     head_ext_file = "Externals.cfg"
 
-    #Determine current directory:
-    currdir = os.getcwd()
-
-    #Determine full CAM externals file path:
-    cam_ext_full_path = os.path.join(currdir,cam_ext_file)
+    #Determine full CAM externals file path (created in the current directory):
+    cam_ext_full_path = os.path.join(os.getcwd(),cam_ext_file)
 
-    #Go to new git (top-level) directory:
-    os.chdir(git_dir)   
-
-    #Copy new Externals_CAM.cfg file to git repository:
-    retcode = retcall(["mv", cam_ext_full_path, "."])     
-
-    #Add new Externals_CAM.cfg file to git:
-    retcode = retcall(["git", "add", cam_ext_file])
-
-    #Quit if git add fails:
-    caller = "git add {} in {}".format(cam_ext_file, git_dir)
-    quitOnFail(retcode, caller) 
-
-    #Add new Externals.cfg file to git:
-    retcode = retcall(["git", "add", head_ext_file])
+    #Move new Externals_CAM.cfg file to git (top-level) directory
+    #(replacing any existing file):
+    try:
+        shutil.move(cam_ext_full_path, os.path.join(git_dir,cam_ext_file))
+    except (IOError, OSError, shutil.Error) as e:
+        perr("Moving {} to {} failed: {}".format(cam_ext_full_path, git_dir, e))
 
-    #Quit if git add fails:
-    caller = "git add {} in {}".format(head_ext_file, git_dir)
-    quitOnFail(retcode, caller)
+    #Add new Externals_CAM.cfg and Externals.cfg files to git (quit if git add fails):
+    checkCall(["git", "add", cam_ext_file, head_ext_file], cwd=git_dir)
 
-    #Commit changes to git respository:
+    #Commit changes to git respository (quit if git commit fails):
     if git_commit:
-        retcode = retcall(["git", "commit", "-m", git_com_msg])
-
-        #quit if git commit fails:
-        caller = "git commit -m {} in {}".format(git_com_msg, git_dir)
-        quitOnFail(retcode, caller)
-
-    #Return to original directory:
-    os.chdir(currdir)
-
-def git_manage_external_add(git_dir):
+        checkCall(["git", "commit", "-m", git_com_msg], cwd=git_dir)
+
+#Source and commit of the "manage_externals" routines:
+manage_ext_url    = "https://github.com/ESMCI/manage_externals"
+manage_ext_commit = "a48558d890d46c51c2508f97aed64b5dd1716b74"
+
+def manage_external_mirror_update(mirror_dir):
+    """Makes sure the local bare mirror of "manage_externals"
+       (created if needed) has the required commit.
+       A lock file keeps concurrent migrations from
+       updating the mirror at the same time."""
+
+    #Lock the mirror (where supported):
+    with open(mirror_dir.rstrip(os.sep)+".lock", 'w') as lock_fil:
+        if fcntl is not None:
+            fcntl.flock(lock_fil, fcntl.LOCK_EX)
+
+        if not os.path.exists(mirror_dir):
+            #Create mirror (quit if git clone fails):
+            checkCall(["git", "clone", "--mirror", manage_ext_url, mirror_dir])
+        elif retcall(["git", "cat-file", "-e", manage_ext_commit+"^{commit}"], cwd=mirror_dir) != 0:
+            #Update mirror, it is missing the commit (quit if git remote update fails):
+            checkCall(["git", "remote", "update"], cwd=mirror_dir)
+    #Lock is released when the lock file is closed
+
+def git_manage_external_add(git_dir, mirror_dir=None):
     """Adds the "manage_externals" routines
        from a remote git repo to the local
-       cam git repo."""
-
-    #Determine current directory:
-    currdir = os.getcwd()
-
-    #Go to new git (top-level) directory:
-    os.chdir(git_dir)
+       cam git repo.  If mirror_dir is present,
+       the commit is fetched from that local
+       mirror of the remote repo instead."""
 
     #Check if "manage_externals" directory does not exist:
-    if not os.path.exists("manage_externals"):
-        #Read in list of git remotes:
-        remote_list = checkOutput(["git", "remote"])
-        
-        #Search for "manage_externals" in list:
-        manage_exist = remote_list.find("manage_externals")
-
-        if(manage_exist != -1):
-            #If remote is present, simply add remote tree to repo:
-            retcode = retcall(["git", "read-tree", "--prefix=manage_externals", \
-                                "-u", "a48558d890d46c51c2508f97aed64b5dd1716b74"])
-
-            #Quit if git  read-tree fails:
-            caller = "git read-tree of manage_externals in {}".format(git_dir)
-            quitOnFail(retcode, caller)
-        else:
-            #If not present, add "manage_externals" remote:
-            retcode = retcall(["git", "remote", "add", "-f", "--tags", "manage_externals", \
-                               "https://github.com/ESMCI/manage_externals"])
-
-            #Quit if git remote add fails:
-            caller = "git remote add of manage_externals in {}".format(git_dir)
-            quitOnFail(retcode, caller)            
-
-            #Now add remote tree to repo:
-            retcode = retcall(["git", "read-tree", "--prefix=manage_externals", \
-                                "-u", "a48558d890d46c51c2508f97aed64b5dd1716b74"])
-
-            #Quit if git  read-tree fails:
-            caller = "git read-tree of manage_externals in {}".format(git_dir)
-            quitOnFail(retcode, caller)
-
-    #Return to original directory:
-    os.chdir(currdir)
+    if not os.path.exists(os.path.join(git_dir,"manage_externals")):
+        fetched = False
+        if mirror_dir is not None:
+            #Fetch the mirror's refs, not just the needed commit, since git
+            #before 2.26 (protocol v0) refuses requests for unadvertised commits:
+            manage_external_mirror_update(mirror_dir)
+            fetched = (retcall(["git", "fetch", "--no-tags", mirror_dir, \
+                                "+refs/*:refs/mirror/*"], cwd=git_dir) == 0)
+            if not fetched:
+                print("WARNING: Could not fetch from {}, fetching from {}".format(mirror_dir, manage_ext_url))
+
+        if not fetched:
+            #Read in list of git remotes:
+            remote_list = checkOutput(["git", "remote"], cwd=git_dir)
+
+            #Search for "manage_externals" in list:
+            manage_exist = remote_list.find("manage_externals")
+
+            if(manage_exist == -1):
+                #If not present, add "manage_externals" remote (quit if git remote add fails):
+                checkCall(["git", "remote", "add", "-f", "--tags", "manage_externals", \
+                           manage_ext_url], cwd=git_dir)
+
+        #Now add remote tree to repo (quit if git read-tree fails):
+        checkCall(["git", "read-tree", "--prefix=manage_externals", \
+                   "-u", manage_ext_commit], cwd=git_dir)
 
 ############################################
 ###
@@ -1315,38 +2008,33 @@ def svn_cam_dir_top_move(svn_dir):
        to the top-level of the local subversion
        repository."""
 
-    #Determine current directory:
-    currdir = os.getcwd()
-
-    #Go to new subversion (top-level) directory:
-    os.chdir(svn_dir)
+    #Set CAM directory path:
+    cam_dir = os.path.join(svn_dir,"components","cam")
 
-    #Move components/cam/bld to top-level svn repository:
-    os.rename("components/cam/bld","./bld")
+    #Move everything in components/cam (bld, cime_config, doc, src, test, tools, etc.)
+    #to top-level svn repository, except CAM's "SVN_EXTERNAL_DIRECTORIES" file:
+    for cam_entry in sorted(os.listdir(cam_dir)):
+        if cam_entry == "SVN_EXTERNAL_DIRECTORIES":
+            continue
 
-    #Move components/cam/cime_config to top-level svn repository:
-    os.rename("components/cam/cime_config","./cime_config")
+        top_entry = os.path.join(svn_dir,cam_entry)
 
-    #Move components/cam/doc to top-level svn repository:
-    os.rename("components/cam/doc","./doc")
+        #Do not overwrite top-level files or directories.  A CAM directory
+        #must not be lost when "components" is removed below, but a loose
+        #CAM file (e.g., README) is dropped as it was before all entries were moved:
+        if os.path.lexists(top_entry):
+            if os.path.isdir(os.path.join(cam_dir,cam_entry)):
+                perr("Cannot move components/cam/{}, {} already exists".format(cam_entry, top_entry))
+            print("WARNING: Dropping components/cam/{}, {} already exists".format(cam_entry, top_entry))
+            continue
 
-    #Move components/cam/src to top-level svn repository:
-    os.rename("components/cam/src","./src")
-
-    #Move components/cam/test to top-level svn repository:
-    os.rename("components/cam/test","./test")
-
-    #Move component/cam/tools to top-level svn repository:
-    os.rename("components/cam/tools","./tools")
+        os.rename(os.path.join(cam_dir,cam_entry), top_entry)
 
     #Remove "components/cam" directory, including "SVN_EXTERNAL_DIRECTORIES" file:
-    shutil.rmtree("components")
+    shutil.rmtree(os.path.join(svn_dir,"components"))
 
     #Remove top-level "SVN_EXTERNAL_DIRECTORIES" file:
-    os.remove("SVN_EXTERNAL_DIRECTORIES")
-
-    #Return to original directory:
-    os.chdir(currdir)
+    os.remove(os.path.join(svn_dir,"SVN_EXTERNAL_DIRECTORIES"))
 
 ##############################
 ###
@@ -1372,17 +2060,17 @@ def parse_arguments():
     parser.add_argument('repo_url', metavar='<svn URL>', type=str,
                         help="the subversion url to process")
     parser.add_argument('--subdir', dest='subdir', metavar='<subdir>',
-                        type=str, nargs=1, default='',
+                        type=str, default=None,
                         help="A subdirectory from which to draw files")
     parser.add_argument('--tags', dest='tag_url', metavar='<tag_url>',
-                        type=str, nargs=1, action='store', default='',
+                        type=str, action='store', default=None,
                         help="the svn URL for tags related to <tag_url>")
     parser.add_argument('--branch', dest='branch_name', metavar='<branch_name>',
-                        type=str, nargs=1, action='store', default='',
+                        type=str, action='store', default='master',
                         help="a git branch name to checkout or create")
     parser.add_argument('--author-table', dest='author_table',
                         metavar='<author_translation_filename>',
-                        type=str, nargs=1, default='',
+                        type=str, default=None,
                         help="""a filename for translating svn commit authors
                         to author string for use in git commits.
                         Each line has a svn author and a git author separated by a colon.
@@ -1398,7 +2086,7 @@ def parse_arguments():
                         Default is False
                         """)
     parser.add_argument('--default-author', dest='default_author',
-                        metavar='[Name <email>]', type=str, nargs=1, default='',
+                        metavar='[Name <email>]', type=str, default=None,
                         help="""An author entry to use when the svn author
                         is not in the author table. This option is ignored if
                         the --author-table argument is not supplied.""")
@@ -1407,8 +2095,8 @@ def parse_arguments():
                         help="""If True, use current date and time for each git commit.
                         If False, use the original svn commit date and time.
                         Default is False""")
-    parser.add_argument('--rev', dest='revisions', metavar="<revision>", type=str,
-                        action='append',
+    parser.add_argument('--rev', dest='revisions', metavar="<revision>", type=parseRevList,
+                        action='append', default=[],
                         help="revision, list of revisions or revision range")
     parser.add_argument('--no-external-cfg', dest='no_extern',
                         action='store_true', default=False,
@@ -1423,7 +2111,68 @@ def parse_arguments():
                                 in the same location.  If False, all of the cam files
                                 will be moved to the top-level of the local git repository.
                                 The default is False""")
-                                
+    parser.add_argument('--tag-workers', dest='tag_workers', metavar='<num>',
+                        type=int, default=8,
+                        help="""The number of svn commands run at the same time
+                                to find the revision of each tag.
+                                The default is 8""")
+    parser.add_argument('--export-workers', dest='export_workers', metavar='<num>',
+                        type=int, default=1,
+                        help="""The number of upcoming revisions exported from svn
+                                in the background while a revision is committed.
+                                Each needs its own full copy of the export tree
+                                (<SVN_dir>.r<rev>) on disk, on top of <SVN_dir>
+                                and the tree it replaces, so scratch disk use
+                                (or RAM, with --tmpfs-export) grows with <num>.
+                                Use 0 to export one revision at a time.
+                                The default is 1""")
+    parser.add_argument('--copy-workers', dest='copy_workers', metavar='<num>',
+                        type=int, default=4,
+                        help="""The number of files compared and copied at the same
+                                time from the svn export to the git repository.
+                                The default is 4""")
+    parser.add_argument('--svn-update', dest='svn_update',
+                        action='store_true', default=False,
+                        help="""If True, keep a subversion working copy in <SVN_dir>
+                                and update it to each revision instead of exporting
+                                every revision in full, so only the changes are
+                                fetched from the server. Requires --no-cam-move.
+                                --export-workers is not used.
+                                The default is False""")
+    parser.add_argument('--svn-diff', dest='svn_diff',
+                        action='store_true', default=False,
+                        help="""If True, apply each revision to <git_dir> as a patch
+                                from svn diff (against the revision before it in
+                                this run) where git apply can, and only export
+                                revisions whose changes it cannot apply (e.g.,
+                                property changes or binary files). Only use this
+                                for repositories without svn:keywords, svn:special
+                                (symbolic links) or CRLF svn:eol-style files, whose
+                                exported contents differ from svn diff's.
+                                Requires --no-cam-move and --no-external-cfg.
+                                The default is False""")
+    parser.add_argument('--tmpfs-export', dest='tmpfs_export',
+                        action='store_true', default=False,
+                        help="""If True, stage svn exports in a temporary directory
+                                on the RAM disk (/dev/shm) instead of <SVN_dir>.
+                                This saves writing every revision to disk but uses
+                                memory for --export-workers + 2 copies of the tree.
+                                <SVN_dir> is used if the RAM disk looks too small
+                                or if neither <SVN_dir> nor <Git_dir> has a tree
+                                to estimate the size from.
+                                Ignored with --svn-update.
+                                The default is False""")
+    parser.add_argument('--cache-dir', dest='cache_dir', metavar='<cache_dir>',
+                        type=str, default=None,
+                        help="""A directory in which to save the tag list and tag
+                                revisions so later runs only need to query svn
+                                again if <tag_url> has changed""")
+    parser.add_argument('--manage-externals-mirror', dest='manage_mirror',
+                        metavar='<mirror_dir>', type=str, default=None,
+                        help="""A local bare mirror of the manage_externals repository
+                                (created if it does not exist). The manage_externals
+                                commit is fetched from there instead of adding a
+                                remote and fetching all of its history from GitHub""")
 
     args = parser.parse_args()
     return args
@@ -1431,111 +2180,164 @@ def parse_arguments():
 
 ###############################################################################
 def _main_func():
-    revlist = []
-    revStart = None # revStart is the first revision in revlist
-
     args = parse_arguments()
     export_dir = args.export_dir
     git_dir = args.git_dir
     repo_url = args.repo_url
-    subdir = args.subdir
+    # An empty --subdir is the same as none (no trailing '/' on the URLs)
+    if args.subdir:
+        subdir = args.subdir
+    else:
+        subdir = None
+    # End if
     tag_url = args.tag_url
     branch_name = args.branch_name
     author_table = args.author_table
     svn_author  = not args.git_author
-    if len(args.default_author) > 0:
-        default_author = args.default_author[0]
-    else:
-        default_author = None
+    default_author = args.default_author
     preserve_dates = not args.current_date
-    revisions = args.revisions
 
     #For externals:
     external = not args.no_extern
 
     #For CAM code location:
     cam_move = not args.no_cam_move
+    tag_workers = args.tag_workers
+    export_workers = args.export_workers
+    copy_workers = args.copy_workers
+    svn_update = args.svn_update
+    if (svn_update and cam_move):
+        perr("--svn-update requires --no-cam-move")
+    # End if
+    svn_diff = args.svn_diff
+    if (svn_diff and (cam_move or external)):
+        perr("--svn-diff requires --no-cam-move and --no-external-cfg")
+    elif svn_diff:
+        # Revisions are only exported when their diff cannot be applied
+        export_workers = 0
+    # End if
+    if svn_update:
+        # The working copy is updated in place, nothing is prefetched
+        export_workers = 0
+    # End if
+    if (args.manage_mirror is not None):
+        manage_mirror = os.path.abspath(args.manage_mirror)
+    else:
+        manage_mirror = None
+    # End if
+    if (args.cache_dir is not None):
+        cache_dir = os.path.abspath(args.cache_dir)
+    else:
+        cache_dir = None
+    # End if
 
     export_dir = os.path.abspath(export_dir)
     git_dir = os.path.abspath(git_dir)
+    if (args.tmpfs_export and svn_update):
+        # The RAM disk copy is removed at exit, the working copy must persist
+        print("WARNING: --tmpfs-export is ignored with --svn-update, updating {}".format(export_dir))
+    elif args.tmpfs_export:
+        # The export tree, the tree being replaced and the prefetched trees
+        export_dir = ramExportDir(export_dir, git_dir, export_workers + 2)
+    # End if
 
-    #Script currently doesn't appear to work with Python version 3, so kill
-    #script with warning if python 3 or greater is being used: 
-    if sys.version_info[0] >= 3:
-        perr("Script only works with Python 2. Please switch python versions.")
-
-    if len(author_table) > 0:
-        auth_table = parseAuthorTable(author_table[0])
+    if (author_table is not None):
+        auth_table = parseAuthorTable(author_table)
     else:
         auth_table = None
 
     # Create a master list of revision ranges to process
-    if (revisions is not None):
-        for revarg in revisions:
-            rlist = revarg.split(",")
-            for rev in rlist:
-                newrev = SvnRevRange(rev)
-                revlist.append(newrev)
-                nstart = newrev
-                if (revStart is None) or (nstart < revStart.revStart()):
-                    revStart = nstart
-                # End if
-            # End for
-        # End for
-    # End if
-
-    if (len(branch_name) == 0):
-        branch_name = 'master'
-    else:
-        branch_name = branch_name[0]
-    # End if
+    revlist = [ rev for revarg in args.revisions for rev in revarg ]
+    # revStart is the first revision in revlist (None if there are none)
+    revStart = min(revlist, key=attrgetter("start"), default=None)
 
     # Set the correct URL for the repo
-    if (len(subdir) > 0):
-        repo_url = os.path.join(repo_url, subdir[0])
-    else:
-        repo_url = repo_url
+    if (subdir is not None):
+        repo_url = svnURLJoin(repo_url, subdir)
     # End if
 
     # Make sure the git directory is ready to go
     gitSetupDir(git_dir, repo_url, branch_name, revStart, repo_url, auth_table, svn_author, preserve_dates, default_author)
-    # Collect all the old svn revision numbers
-    gitLog = gitCaptureLog(git_dir)
-    gitRevs = [ x.revNum() for x in gitLog ]
+    # Collect all the old svn revision numbers (saved by an earlier run
+    # unless the branch has changed since, otherwise from the git log)
+    # The state and HEAD are kept up to date below rather than reread
+    gitState = gitLoadState(git_dir)
+    gitHead = gitCurrentBranch(git_dir)[1]
+    migratedRevs = gitLoadRevs(gitState, branch_name, gitHead)
+    if migratedRevs is None:
+        gitLog = gitCaptureLog(git_dir)
+        migratedRevs = sorted(set([ x.revNum() for x in gitLog ]))
+        gitSaveRevs(git_dir, gitState, branch_name, gitHead, migratedRevs)
+    # End if
+    gitRevs = set(migratedRevs)
 
     # Create new tag lists:
     tag_rev_list = list()
     tag_str_list = list()
 
     # Determine the subversion revisions associated with each tag (if any):
-    if (len(tag_url) > 0):
-        print("Processing tags from {}".format(tag_url[0]))
+    if (tag_url is not None):
+        print("Processing tags from {}".format(tag_url))
+        if cache_dir:
+            # Reuse the tag information from an earlier run if still valid
+            tagRootRev = svnLoadTagCache(cache_dir, tag_url)
+        # End if
         # Find all the tags:
-        svnTags = svnList(tag_url[0])
+        svnTags = svnList(tag_url)
         if (svnTags is not None):
-            for tag in svnTags:
-                # Set the correct URL for the repo
-                tag_url_full = os.path.join(tag_url[0], tag)
-                if (len(subdir) > 0):
-                    tag_url_full = os.path.join(tag_url_full, subdir[0])
-                # End if
-                #Dtermine revision associated with tag:
-                tagRev = svnLastChangedRev(tag_url_full)
+            # The subdirectory (if any) is the same below every tag
+            if (subdir is not None):
+                tagSubdir = (subdir,)
+            else:
+                tagSubdir = ()
+            # End if
+            # Set the correct URL for the repo
+            tag_urls = [svnURLJoin(tag_url, tag, *tagSubdir) for tag in svnTags]
+            #Determine revisions associated with all tags at once:
+            tagRevs = svnLastChangedRevs(tag_urls, workers=tag_workers)
+            if cache_dir:
+                svnSaveTagCache(cache_dir, tag_url, tagRootRev, tag_urls)
+            # End if
+            for tag, tagRev in zip(svnTags, tagRevs):
                 #Add tag to lists:
                 tag_str_list.append(tag)
                 tag_rev_list.append(tagRev)
+            # End for
+    # Sort the tags by revision once for all the svnCaptureLog calls below
+    if tag_rev_list:
+        (tag_rev_ints, tag_strs) = sortTags(tag_rev_list, tag_str_list)
+    else:
+        (tag_rev_ints, tag_strs) = (None, None)
+    # End if
 
-    # Capture all the revision log info
+    # Capture all the revision log info (with tags if there are any)
+    # Fetch the merged revision ranges with one svn log call, then split
+    # the (ascending) result back into the requested ranges
+    revstrs = mergeRevRanges(revlist)
+    allLogs = None
+    if (len(revstrs) > 0):
+        # Tags are matched as if each range were captured on its own
+        rangeEnds = sorted(set([ x.revBounds()[1] for x in revlist if x.revBounds() ]))
+        allLogs = svnCaptureLog(repo_url, revstrs, auth_table, svn_author, preserve_dates, default_author=default_author, \
+                                tag_rev_ints=tag_rev_ints, tag_strs=tag_strs, range_ends=rangeEnds)
+        if ((allLogs is None) and (len(revlist) == 1)):
+            allLogs = []
+        # End if (svn log fails if any range is bad, otherwise try the ranges one at a time)
+    # End if
+    if (allLogs is not None):
+        allRevs = [ x.revNum() for x in allLogs ]
+    # End if
     svnLog = list()
     for rev in revlist:
-        #check if tag lists are non-empty:
-        if tag_rev_list:
-            # Capture the log messages for range, 'rev' with tag included:
-            logs = svnCaptureLog(repo_url, rev.revString(), auth_table, svn_author, preserve_dates, default_author=default_author, \
-                                 tag_rev_list=tag_rev_list, tag_str_list=tag_str_list)
+        bounds = rev.revBounds()
+        if ((allLogs is not None) and (bounds is not None)):
+            logs = allLogs[bisect.bisect_left(allRevs, bounds[0]):bisect.bisect_right(allRevs, bounds[1])]
         else:
-            # Capture the log messages for range, 'rev'
-            logs = svnCaptureLog(repo_url, rev.revString(), auth_table, svn_author, preserve_dates, default_author=default_author)
+            logs = svnCaptureLog(repo_url, rev.revString(), auth_table, svn_author, preserve_dates, default_author=default_author, \
+                                 tag_rev_ints=tag_rev_ints, tag_strs=tag_strs)
+            if logs is None:
+                logs = []
+            # End if
         # End if
 
         if (len(logs) > 0):
@@ -1543,22 +2345,57 @@ def _main_func():
         else:
             print("No revisions found for {}".format(rev.revString()))
         # End if
-        for log in logs:
-            if (log.revNum() not in gitRevs):
-                svnLog.append(log)
-            else:
-                print("Skipping revision {}, already in git repo".format(log.revNum()))
-            # End if
-        # End for
+        logRevs = [ x.revNum() for x in logs ]
+        if (gitRevs.isdisjoint(logRevs)):
+            # Usual case, nothing in this range has been migrated yet
+            svnLog.extend(logs)
+            # Overlapping revision ranges must not add a revision twice
+            gitRevs.update(logRevs)
+        else:
+            skipped = list()
+            for log in logs:
+                if (log.revNum() not in gitRevs):
+                    svnLog.append(log)
+                    gitRevs.add(log.revNum())
+                else:
+                    skipped.append("Skipping revision {}, already in git repo\n".format(log.revNum()))
+                # End if
+            # End for
+            # One write for all the skipped revisions of this range
+            sys.stdout.write("".join(skipped))
+        # End if
     # End for
     
     # Sort the requested svn revisions
-    logs = sorted(svnLog, key = lambda x: x.revNum())
+    # (the revision number attribute makes a C-level sort key)
+    logs = sorted(svnLog, key=attrgetter("revnum"))
 
     # Process the sorted log revisions
-    for log in logs:
-        processRevision(export_dir, git_dir, log, external, cam_move)
-    # End for
+    # Up to export_workers upcoming revisions are exported in the background
+    # Only revisions which made a commit are recorded as migrated, the
+    # state is saved every gitStateInterval commits and when done (or quitting)
+    unsaved = 0
+    try:
+        for lidx in range(len(logs)):
+            nextLogs = logs[lidx + 1:lidx + 1 + export_workers]
+            newHead = processRevision(export_dir, git_dir, logs[lidx], external, cam_move, nextLogs=nextLogs,
+                                      manage_mirror=manage_mirror, copy_workers=copy_workers,
+                                      svn_update=svn_update, svn_diff=svn_diff)
+            if (newHead is not None):
+                gitHead = newHead
+                bisect.insort(migratedRevs, logs[lidx].revNum())
+                unsaved = unsaved + 1
+            # End if
+            if (unsaved >= gitStateInterval):
+                gitSaveRevs(git_dir, gitState, branch_name, gitHead, migratedRevs)
+                unsaved = 0
+            # End if
+        # End for
+    finally:
+        if (unsaved > 0):
+            gitSaveRevs(git_dir, gitState, branch_name, gitHead, migratedRevs)
+        # End if
+    # End try
 # End _main_func
 
 ###############################################################################